@@ -2,9 +2,24 @@ from datasets.ve8 import VE8Dataset
 from torch.utils.data import DataLoader
 
 from datasets.zju_va import zjuVADataset
+from core.utils import get_spatial_transform
+from transforms.temporal import TSN
+from transforms.target import ClassLabel
 
 def get_ve8(opt, subset, transforms):
     spatial_transform, temporal_transform, target_transform = transforms
+    # snippet cache 和 counter-based 增强只在 zju_va 上实现，不能让选项在 ve8 上静默失效
+    if opt.snippet_cache_path != '':
+        raise Exception('--snippet_cache_path is only supported for zju_va')
+    if opt.aug_seed >= 0 or opt.n_aug_views > 0:
+        raise Exception('--aug_seed / --n_aug_views are only supported for zju_va')
+    if opt.tta_views > 0:
+        raise Exception('--tta_views is only supported for zju_va')
+    if opt.n_folds > 1:
+        raise Exception('--n_folds / --fold are only supported for zju_va')
+    # VE8Dataset 总是读两种模态，单模态只在 zju_va 上实现
+    if opt.modality != 'av':
+        raise Exception('--modality {} is only supported for zju_va'.format(opt.modality))
     return VE8Dataset(opt.video_path,
                       opt.audio_path,
                       opt.annotation_path,
@@ -17,6 +32,9 @@ def get_ve8(opt, subset, transforms):
     
 def get_zju_va(opt, subset, transforms):
     spatial_transform, temporal_transform, target_transform = transforms
+    # 增强视图由 counter-based 的 aug_seed 生成，没有 aug_seed 时 n_aug_views 不会生效
+    if opt.n_aug_views > 0 and opt.aug_seed < 0:
+        raise Exception('--n_aug_views requires --aug_seed >= 0')
     return zjuVADataset(opt.video_path,
                         opt.audio_path,
                         opt.annotation_path,
@@ -25,7 +43,14 @@ def get_zju_va(opt, subset, transforms):
                         spatial_transform,
                         temporal_transform,
                         target_transform,
-                        need_audio=True)
+                        need_audio=opt.modality != 'visual',
+                        need_visual=opt.modality != 'audio',
+                        snippet_cache_path=opt.snippet_cache_path,
+                        aug_seed=opt.aug_seed if subset == 'training' else -1,
+                        n_aug_views=opt.n_aug_views,
+                        n_tta_views=opt.tta_views if subset != 'training' else 0,
+                        n_folds=opt.n_folds,
+                        fold=opt.fold)
 
 
 def get_training_set(opt, spatial_transform, temporal_transform, target_transform):
@@ -68,6 +93,17 @@ def get_data_loader(opt, dataset, shuffle, batch_size=0):
         batch_size=batch_size,
         shuffle=shuffle,
         num_workers=opt.n_threads,
-        pin_memory=True,
+        pin_memory=opt.device.type == 'cuda',
         drop_last=opt.dl
     )
+
+
+def get_evaluation_set(opt):
+    """确定性预处理 (center crop + TSN(center=True)) 的 validation 集，保证多次评估看到完全相同的输入"""
+    spatial_transform = get_spatial_transform(opt, 'val')
+    temporal_transform = TSN(seq_len=opt.seq_len, snippet_duration=opt.snippet_duration, center=True)
+    return get_validation_set(opt, spatial_transform, temporal_transform, ClassLabel())
+
+
+def get_evaluation_loader(opt):
+    return get_data_loader(opt, get_evaluation_set(opt), shuffle=False)
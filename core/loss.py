@@ -41,7 +41,7 @@ class PCCEVE8(nn.Module):
             if (y_numpy_i in self.POSITIVE and y_pred_label_numpy_i in self.NEGATIVE) or (
                     y_numpy_i in self.NEGATIVE and y_pred_label_numpy_i in self.POSITIVE):
                 weight[i] += self.lambda_0
-        weight_tensor = torch.from_numpy(np.array(weight)).cuda()
+        weight_tensor = torch.from_numpy(np.array(weight)).to(out.device)
         out = out.mul(weight_tensor)
         out = torch.mean(out)
 
@@ -61,8 +61,8 @@ def get_loss(opt):
             assert outputs.shape == targets.shape, "Outputs and targets must have the same shape"
             assert outputs.shape[1] == 2, "The second dimension of outputs and targets must be 2 (representing V and A)"
 
-            v_loss = nn.MSELoss()(outputs[:, 0], targets[:, 0]).cuda()
-            a_loss = nn.MSELoss()(outputs[:, 1], targets[:, 1]).cuda()
+            v_loss = nn.MSELoss()(outputs[:, 0], targets[:, 0])
+            a_loss = nn.MSELoss()(outputs[:, 1], targets[:, 1])
 
             return (v_loss + a_loss) / 2
 
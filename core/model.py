@@ -1,5 +1,10 @@
+import copy
+
+import torch
 import torch.nn as nn
 from models.vaanet import VAANet
+from models.ensemble import VAANetEnsemble
+from core.utils import AMP_DTYPES
 
 
 def generate_model(opt):
@@ -11,6 +16,81 @@ def generate_model(opt):
         audio_embed_size=opt.audio_embed_size,
         audio_n_segments=opt.audio_n_segments,
         pretrained_resnet101_path=opt.resnet101_pretrained,
+        backbone_chunk_size=opt.backbone_chunk_size,
+        ft_begin_index=opt.ft_begin_index,
+        grad_checkpoint=opt.grad_checkpoint,
+        prefix_cache_size=opt.prefix_cache_size,
+        resnet_depth=opt.resnet_depth,
+        feature_grid=opt.feature_grid,
+        modality=opt.modality,
+        modality_dropout=opt.modality_dropout,
+        student_path=opt.student_path,
     )
-    model = model.cuda()
+    model = model.to(opt.device)
+    if opt.amp != 'none':
+        # 冻结的 backbone 不需要 fp32 主权重，直接以低精度保存，省掉每步的权重转换
+        model.resnet.to(AMP_DTYPES[opt.amp])
+    if opt.compile:
+        model.enable_compile()
+    if opt.audio_threads > 0 and opt.device.type == 'cpu':
+        # CUDA 上两个分支的 kernel 已经在同一个 stream 上异步排队，多一个线程没有重叠的收益
+        model.enable_concurrent_branches(opt.audio_threads)
     return model, model.parameters()
+
+
+def load_checkpoint(model, checkpoint_path):
+    print('Loading checkpoint {}'.format(checkpoint_path))
+    states = torch.load(checkpoint_path, map_location='cpu')
+    # 冻结的 backbone 来自 --resnet101_pretrained 且已折叠 BN，不从 checkpoint 读
+    # (旧 checkpoint 里是未折叠的 resnet.* 权重)
+    # 换成 student 时 resnet_ft 已被蒸馏进 student，checkpoint 里 fine-tune 过的 stage 也不需要
+    skipped = ('resnet.', 'resnet_ft.') if getattr(model, 'student_path', '') != '' else ('resnet.',)
+    state_dict = {k: v for k, v in states['state_dict'].items() if not k.startswith(skipped)}
+    missing, unexpected = model.load_state_dict(state_dict, strict=False)
+    missing = [k for k in missing if not k.startswith('resnet.')]
+    assert len(missing) == 0 and len(unexpected) == 0, (missing, unexpected)
+    return states
+
+
+def copy_trainable(model, n):
+    """
+    model 的 n 份副本，共享冻结的 backbone 和并发线程池；其余参数 (fine-tune 的 stage、heads、音频分支) 各自独立
+    """
+    # 复制时不复制 backbone、并发线程池和 torch.compile 挂在实例上的函数
+    shared = {'resnet': model.resnet, 'audio_runner': model.audio_runner}
+    compiled = {name: model.__dict__.pop(name) for name in ['_visual_heads', '_audio_branch'] if name in model.__dict__}
+    model.resnet, model.audio_runner = None, None
+    copies = []
+    try:
+        for _ in range(n):
+            member = copy.deepcopy(model)
+            member.resnet, member.audio_runner = shared['resnet'], shared['audio_runner']
+            if len(compiled) > 0:
+                member.enable_compile()
+            copies.append(member)
+    finally:
+        model.resnet, model.audio_runner = shared['resnet'], shared['audio_runner']
+        model.__dict__.update(compiled)
+    return copies
+
+
+def build_ensemble(model, checkpoint_paths):
+    """
+    用已构建好的 model 提供共享的冻结 backbone，每个 checkpoint 复制一份其余的参数
+    """
+    members = copy_trainable(model, len(checkpoint_paths))
+    for member, path in zip(members, checkpoint_paths):
+        load_checkpoint(member, path)
+    return VAANetEnsemble(members)
+
+
+def load_inference_model(opt):
+    """推理用的模型：--ensemble_checkpoints 给出时是共享 backbone 的 ensemble，否则是 --checkpoint"""
+    model, _ = generate_model(opt)
+    if len(opt.ensemble_checkpoints) > 0:
+        model = build_ensemble(model, opt.ensemble_checkpoints)
+    else:
+        assert opt.checkpoint != '', '--checkpoint or --ensemble_checkpoints is required'
+        load_checkpoint(model, opt.checkpoint)
+    model.eval()
+    return model
@@ -0,0 +1,78 @@
+import copy
+import json
+import os
+
+from tensorboardX import SummaryWriter
+
+from core.model import copy_trainable
+from core.loss import get_loss
+from core.optimizer import get_optim
+from core.utils import get_grad_scaler
+
+# 每个 head 可以单独设置的选项；只影响可训练部分，不改变参数形状，所以各 head 可以从同一个模型复制
+HEAD_OPTS = ['learning_rate', 'weight_decay', 'loss_func', 'lambda_0', 'modality_dropout', 'accumulation_steps']
+
+
+class TrainingHead(object):
+    """
+    One configuration of multi-head training: a copy of the trainable part of VAANet (fine-tuned stages,
+    attention heads, audio branch, av_fc) with its own options, loss, optimizer, grad scaler and
+    TensorBoard writer. Checkpoints go to <result_path>/heads/<name>/checkpoints.
+    """
+
+    def __init__(self, name, opt, model):
+        self.name = name
+        self.opt = opt
+        self.model = model
+        self.criterion = get_loss(opt)
+        self.optimizer = get_optim(opt, model.parameters())
+        self.scaler = get_grad_scaler(opt)
+        self.writer = SummaryWriter(logdir=opt.log_path)
+        self.best_pcc = float('-inf')
+
+
+def load_head_configs(path):
+    """
+    读 --head_configs：JSON 列表，每一项是 {"name": ..., <HEAD_OPTS 里的选项>: ...}，没给的选项沿用命令行
+    """
+    with open(path, 'r') as f:
+        configs = json.load(f)
+    if not isinstance(configs, list) or len(configs) == 0:
+        raise Exception('{} must contain a non-empty JSON list of head configurations'.format(path))
+    names = []
+    for i, config in enumerate(configs):
+        unknown = [key for key in config if key != 'name' and key not in HEAD_OPTS]
+        if len(unknown) > 0:
+            raise Exception('Head {} of {} sets {}, but only {} can differ between heads'.format(
+                i, path, unknown, HEAD_OPTS))
+        names.append(str(config.get('name', 'head{}'.format(i))))
+    if len(set(names)) != len(names):
+        raise Exception('Head names in {} are not unique: {}'.format(path, names))
+    return [(name, {k: v for k, v in config.items() if k != 'name'}) for name, config in zip(names, configs)]
+
+
+def head_opt(opt, name, overrides):
+    """opt 的副本：覆盖 head 的选项，日志和 checkpoint 放到 <result_path>/heads/<name>/ 下"""
+    hopt = copy.copy(opt)
+    for key, value in overrides.items():
+        setattr(hopt, key, type(getattr(opt, key))(value))
+    hopt.log_path = os.path.join(opt.result_path, 'heads', name, 'tensorboard')
+    hopt.ckpt_path = os.path.join(opt.result_path, 'heads', name, 'checkpoints')
+    os.makedirs(hopt.log_path, exist_ok=True)
+    os.makedirs(hopt.ckpt_path, exist_ok=True)
+    return hopt
+
+
+def build_training_heads(opt, model):
+    """
+    按 --head_configs 构建各个 head。第一个 head 直接用 model，其余复制 model 的可训练部分，
+    所有 head 共享 model 的冻结 backbone，因此初始权重相同，只有配置不同
+    """
+    configs = load_head_configs(opt.head_configs)
+    models = [model] + copy_trainable(model, len(configs) - 1)
+    heads = []
+    for (name, overrides), member in zip(configs, models):
+        hopt = head_opt(opt, name, overrides)
+        member.modality_dropout = hopt.modality_dropout
+        heads.append(TrainingHead(name, hopt, member))
+    return heads
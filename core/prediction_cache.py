@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+
+# 影响模型输出的选项：结构、输入几何和推理方式。device 不在其中 (CPU/GPU 的数值差异可以忽略)
+PREDICTION_OPTS = ['seq_len', 'snippet_duration', 'sample_size', 'fps', 'resnet_depth', 'feature_grid',
+                   'audio_embed_size', 'audio_n_segments', 'modality', 'amp', 'early_exit_threshold',
+                   'early_exit_max_weight', 'early_exit_min_snippets', 'tta_views']
+
+
+def file_digest(path, memo_dir=''):
+    """
+    文件内容的 sha256。memo_dir 非空时按 (path, size, mtime) 记住结果，
+    这样几百 MB 的 checkpoint 在没有改动时不用每次重新读一遍
+    """
+    stat = os.stat(path)
+    memo_key = '{}|{}|{}'.format(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    memo_path = os.path.join(memo_dir, 'digests.json') if memo_dir != '' else ''
+    memo = {}
+    if memo_path != '' and os.path.exists(memo_path):
+        with open(memo_path, 'r') as f:
+            memo = json.load(f)
+        if memo_key in memo:
+            return memo[memo_key]
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    digest = sha.hexdigest()
+    if memo_path != '':
+        memo[memo_key] = digest
+        _atomic_write_json(memo_path, memo)
+    return digest
+
+
+def prediction_config(opt, input_signature, digests):
+    """描述输入和推理配置的字符串：预处理签名 + PREDICTION_OPTS + 不在 checkpoint 里的权重文件的 digest"""
+    config = {name: getattr(opt, name) for name in PREDICTION_OPTS}
+    config['input'] = input_signature
+    config['weights'] = digests
+    return json.dumps(config, sort_keys=True)
+
+
+def _atomic_write_json(path, obj):
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+class PredictionCache(object):
+    """
+    Content-addressed cache of per-video predictions, keyed by (checkpoint digest, video id, input config).
+    All predictions of one (checkpoint, config) pair are kept in one JSON file
+    root/<checkpoint digest>/<config digest>.json mapping video id -> [valence, arousal].
+    """
+
+    def __init__(self, root, checkpoint_digest, config):
+        config_digest = hashlib.sha256(config.encode('utf-8')).hexdigest()
+        directory = os.path.join(root, checkpoint_digest[:32])
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, '{}.json'.format(config_digest[:32]))
+        self.predictions = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.predictions = json.load(f)['predictions']
+        self.config = config
+
+    def get(self, video_id):
+        return self.predictions.get(video_id)
+
+    def update(self, predictions):
+        self.predictions.update(predictions)
+        _atomic_write_json(self.path, {'config': self.config, 'predictions': self.predictions})
@@ -0,0 +1,96 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class LatencyStats(object):
+    """最近 window 个请求的延迟 (秒)，线程安全"""
+
+    def __init__(self, window=1000):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.values.append(seconds)
+            self.count += 1
+
+    def percentile(self, q):
+        with self.lock:
+            values = sorted(self.values)
+        if len(values) == 0:
+            return 0.0
+        return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'p50_ms': 1000 * self.percentile(50),
+            'p99_ms': 1000 * self.percentile(99),
+        }
+
+
+class DynamicBatcher(object):
+    """
+    Gathers concurrent requests into batches for one model call.
+    A batch is closed when it has max_batch_size items or when max_delay seconds have passed since its
+    first item was queued, whichever comes first, so a request waits at most max_delay before the model runs.
+    fn maps a list of items to a list of results and runs on a single background thread.
+    """
+
+    def __init__(self, fn, max_batch_size=8, max_delay=0.01):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.latency = LatencyStats()
+        self.batch_sizes = deque(maxlen=1000)
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self.queue.put((time.time(), item, future))
+        return future
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def _next_batch(self):
+        first = self.queue.get()
+        batch = [first]
+        deadline = first[0] + self.max_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self.fn([item for _, item, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            now = time.time()
+            self.batch_sizes.append(len(batch))
+            for (queued, _, future), result in zip(batch, results):
+                self.latency.add(now - queued)
+                future.set_result(result)
+
+    def summary(self):
+        sizes = list(self.batch_sizes)
+        summary = {'queue_depth': self.depth(),
+                   'mean_batch_size': sum(sizes) / len(sizes) if len(sizes) > 0 else 0.0}
+        summary.update({'queue_and_model_' + k: v for k, v in self.latency.summary().items()})
+        return summary
@@ -0,0 +1,89 @@
+import itertools
+import json
+import math
+import random
+
+
+def _sample(spec, rng):
+    """随机搜索里一个选项的取值：列表里均匀选一个，或 {"uniform": [a, b]} / {"log_uniform": [a, b]} / {"int": [a, b]}"""
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    if isinstance(spec, dict) and len(spec) == 1:
+        kind, (low, high) = next(iter(spec.items()))
+        if kind == 'uniform':
+            return rng.uniform(low, high)
+        if kind == 'log_uniform':
+            return math.exp(rng.uniform(math.log(low), math.log(high)))
+        if kind == 'int':
+            return rng.randint(low, high)
+    raise Exception('Cannot sample from {}; use a list, uniform, log_uniform or int'.format(spec))
+
+
+def load_search_space(path):
+    """
+    读搜索空间的 JSON，返回配置列表 (每个配置是 {opt 名: 值})
+    {"grid": {"learning_rate": [8e-5, 3e-4], "loss_func": ["va_mse", "mse"]}}: 所有组合
+    {"random": {"learning_rate": {"log_uniform": [1e-5, 1e-3]}, ...}, "n_trials": 20, "seed": 0}: 随机采样
+    """
+    with open(path, 'r') as f:
+        space = json.load(f)
+    if 'grid' in space:
+        names = list(space['grid'])
+        return [dict(zip(names, values)) for values in itertools.product(*(space['grid'][n] for n in names))]
+    if 'random' in space:
+        rng = random.Random(space.get('seed', 0))
+        return [{name: _sample(spec, rng) for name, spec in space['random'].items()}
+                for _ in range(space.get('n_trials', 10))]
+    raise Exception('{} must define "grid" or "random"'.format(path))
+
+
+def config_args(config, defaults):
+    """把配置转成 main.py 的命令行参数；defaults 是 parse_opts() 的结果，用来检查选项名和识别 store_true"""
+    args = []
+    for name, value in config.items():
+        if not hasattr(defaults, name):
+            raise Exception('Unknown option in the search space: {}'.format(name))
+        if isinstance(getattr(defaults, name), bool):
+            if value:
+                args.append('--' + name)
+        elif isinstance(value, list):
+            args += ['--' + name] + [str(v) for v in value]
+        else:
+            args += ['--' + name, str(value)]
+    return args
+
+
+def rung_epochs(min_epochs, eta, n_epochs):
+    """successive halving 的检查点：min_epochs, min_epochs * eta, ...，都小于 n_epochs"""
+    rungs = []
+    epoch = min_epochs
+    while epoch < n_epochs:
+        rungs.append(epoch)
+        epoch *= eta
+    return rungs
+
+
+class SuccessiveHalving(object):
+    """
+    Asynchronous successive halving: a trial that reaches a rung epoch continues only if its
+    validation PCC is among the top 1/eta of all trials that have reached that rung so far.
+    Trials are compared within their fold, since folds differ in difficulty. Decisions are made as
+    results arrive, so no trial waits for the rest of its rung; early arrivals are judged against
+    fewer peers and are therefore promoted more easily.
+    """
+
+    def __init__(self, rungs, eta):
+        self.rungs = set(rungs)
+        self.eta = eta
+        self.results = {}
+
+    def keep(self, fold, epoch, pcc):
+        """记录 (fold, epoch) 这个检查点上的结果，返回这个 trial 是否继续"""
+        if epoch not in self.rungs:
+            return True
+        if math.isnan(pcc):
+            pcc = float('-inf')
+        results = self.results.setdefault((fold, epoch), [])
+        results.append(pcc)
+        n_kept = max(1, int(math.ceil(len(results) / self.eta)))
+        return sorted(results, reverse=True).index(pcc) < n_kept
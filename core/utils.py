@@ -1,6 +1,9 @@
 import os
+import json
 import datetime
 import shutil
+import contextlib
+import torch
 
 from transforms.spatial import Preprocessing
 
@@ -16,11 +19,18 @@ def _next_suffix(path):
             return new_path
         suffix += 1
 
+def local2global_data_path(opt):
+    """只补全数据路径，不创建结果目录；给不需要写日志和 checkpoint 的工具用"""
+    if opt.root_path == '':
+        raise Exception
+    opt.video_path = os.path.join(opt.root_path, opt.video_path)
+    opt.audio_path = os.path.join(opt.root_path, opt.audio_path)
+    opt.annotation_path = os.path.join(opt.root_path, opt.annotation_path)
+
+
 def local2global_path(opt):
     if opt.root_path != '':
-        opt.video_path = os.path.join(opt.root_path, opt.video_path)
-        opt.audio_path = os.path.join(opt.root_path, opt.audio_path)
-        opt.annotation_path = os.path.join(opt.root_path, opt.annotation_path)
+        local2global_data_path(opt)
         if opt.debug:
             opt.result_path = "debug"
         opt.result_path = os.path.join(opt.root_path, opt.result_path)
@@ -57,6 +67,56 @@ def local2global_path(opt):
         raise Exception
 
 
+def append_metrics(path, record):
+    """往 metrics.jsonl 追加一行 (例如每个 epoch 的 val PCC)，供 sweep.py 这类外部进程读取"""
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def setup_device(opt):
+    """把 opt.device 从字符串换成 torch.device，并设置 device_ids 和 CPU 线程数"""
+    if opt.device == 'cuda' and not torch.cuda.is_available():
+        raise Exception('CUDA is not available, run with --device cpu')
+    opt.device = torch.device(opt.device)
+    if opt.device.type == 'cuda':
+        opt.device_ids = list(range(torch.cuda.device_count()))
+    else:
+        opt.device_ids = []
+        if opt.intra_op_threads > 0:
+            torch.set_num_threads(opt.intra_op_threads)
+        if opt.audio_threads > 0:
+            # 音频分支的工作线程用 audio_threads 个 OpenMP 线程，剩下的留给视觉分支 (见 models.concurrency.BranchRunner)
+            torch.set_num_threads(max(1, torch.get_num_threads() - opt.audio_threads))
+        if opt.inter_op_threads > 0:
+            # 只能在第一次并行计算之前设置
+            torch.set_num_interop_threads(opt.inter_op_threads)
+        print('CPU threads: intra-op {}, inter-op {}'.format(torch.get_num_threads(), torch.get_num_interop_threads()))
+
+
+AMP_DTYPES = {
+    'bf16': torch.bfloat16,
+    'fp16': torch.float16,
+}
+
+
+def amp_autocast(opt):
+    """--amp 对应的 autocast 上下文；--amp none 时什么都不做"""
+    if opt.amp == 'none':
+        return contextlib.nullcontext()
+    if not hasattr(torch, 'autocast'):
+        raise Exception('--amp needs torch>=1.10')
+    return torch.autocast(device_type=opt.device.type, dtype=AMP_DTYPES[opt.amp])
+
+
+def get_grad_scaler(opt):
+    """只有 CUDA 上的 fp16 需要 loss scaling，bf16 的指数位和 fp32 一样；不需要时返回 None"""
+    if opt.amp != 'fp16' or opt.device.type != 'cuda':
+        return None
+    if not hasattr(torch.cuda, 'amp') or not hasattr(torch.cuda.amp, 'GradScaler'):
+        raise Exception('--amp fp16 needs torch>=1.6 for loss scaling')
+    return torch.cuda.amp.GradScaler()
+
+
 def get_spatial_transform(opt, mode):
     if mode == "train":
         return Preprocessing(size=opt.sample_size, is_aug=True, center=False)
@@ -92,19 +152,35 @@ class AverageMeter(object):
 
 def process_data_item(opt, data_item):
     visual, target, audio, visualization_item = data_item
-    target = target.cuda()
+    target = target.to(opt.device, non_blocking=True)
 
-    visual = visual.cuda()
-    audio = audio.cuda()
+    # 缓存的 snippets 是 uint8，搬到设备上之后再转 float
+    visual = visual.to(opt.device, non_blocking=True).float()
+    audio = audio.to(opt.device, non_blocking=True)
     assert visual.size(0) == audio.size(0)
     batch = visual.size(0)
     return visual, target, audio, visualization_item, batch
 
 
-def run_model(opt, inputs, model, criterion, i=0, print_attention=True, period=30, return_attention=False):
+def get_feature_keys(visualization_item):
+    """数据集给出的可复现输入的 key (见 zjuVADataset.__getitem__)；没有时返回 None"""
+    if len(visualization_item) < 2:
+        return None
+    return list(visualization_item[1])
+
+
+def run_model(opt, inputs, model, criterion, i=0, print_attention=True, period=30, return_attention=False, keys=None,
+              prefix=None):
     visual, target, audio = inputs
-    outputs = model(visual, audio)
+    with amp_autocast(opt):
+        # prefix: 其他模型已经算好的冻结前缀输出 (多 head 训练时共享)
+        if prefix is not None:
+            outputs = model(visual, audio, keys=keys, prefix=prefix)
+        else:
+            outputs = model(visual, audio, keys=keys)
     y_pred, alpha, beta, gamma = outputs
+    # loss 在 autocast 之外用 fp32 计算
+    y_pred = y_pred.float()
     loss = criterion(y_pred, target)
     if i % period == 0 and print_attention:
         print('====alpha====')
@@ -118,6 +194,33 @@ def run_model(opt, inputs, model, criterion, i=0, print_attention=True, period=3
     else:
         return y_pred, loss, [alpha, beta, gamma]
 
+def infer(opt, model, visual, audio):
+    """推理用的前向：--early_exit_threshold > 0 时走 early exit。返回 output [bs x 2] 和 gamma [bs x seq_len]"""
+    with amp_autocast(opt):
+        # early exit 只支持单视角输入；TTA 的多视角输入 [bs, n_views, ...] 走普通 forward
+        if opt.early_exit_threshold > 0 and opt.modality != 'audio' and visual.dim() == 6 and \
+                hasattr(model, 'forward_early_exit'):
+            output, gamma, _ = model.forward_early_exit(visual, audio, opt.early_exit_threshold,
+                                                        opt.early_exit_max_weight, opt.early_exit_min_snippets)
+        else:
+            output, _, _, gamma = model(visual, audio)
+    return output.float(), gamma.float()
+
+
+def predict(opt, model, data_loader):
+    """跑一遍 data_loader，返回 [N,2] 的预测、[N,2] 的标签和对应的 video_id"""
+    model.eval()
+    preds_all, targets_all, video_ids = [], [], []
+    with torch.no_grad():
+        for data_item in data_loader:
+            visual, target, audio, visualization_item, _ = process_data_item(opt, data_item)
+            output, _ = infer(opt, model, visual, audio)
+            preds_all.append(output.cpu())
+            targets_all.append(target.cpu())
+            video_ids.extend(visualization_item[0])
+    return torch.cat(preds_all, dim=0), torch.cat(targets_all, dim=0), video_ids
+
+
 # TODO 3. 正确率函数换为 R2、MSE、PCC
 # def calculate_accuracy(outputs, targets):
 #     batch_size = targets.size(0)
@@ -131,8 +234,6 @@ def run_model(opt, inputs, model, criterion, i=0, print_attention=True, period=3
 #     return n_correct_elements / batch_size
 
 
-import torch
-
 def calculate_accuracy(outputs, targets, metric='r2'):
     """
     计算 V 和 A 两个维度的正确率，并返回平均值。
@@ -0,0 +1,141 @@
+"""
+Dataset over raw video files (mp4 etc.) for prediction on videos that never went through
+tools/video2jpg.py / video2mp3.py. Frames are decoded with ffmpeg into a pipe at the same height (240)
+as the jpg extraction, and only the frames picked by the temporal transform are kept, so memory does not
+grow with the length of the video. The MFCC are computed from the video's own audio track.
+"""
+import json
+import os
+import subprocess
+
+import numpy as np
+import torch
+import torch.utils.data as data
+from PIL import Image
+
+from datasets.zju_va import mfcc_timeseries
+from transforms.tta import MultiViewTransform
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.webm')
+FRAME_HEIGHT = 240  # 和 tools/video2jpg.py 的 scale=-1:240 一致
+
+
+def list_videos(inputs):
+    """视频文件和目录 (递归) 展开成排好序的视频路径列表"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(VIDEO_EXTENSIONS))
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            raise Exception('No such video file or directory: {}'.format(item))
+    return sorted(set(os.path.abspath(path) for path in paths))
+
+
+def probe_video(path):
+    """(帧数, 宽, 高)；帧数用 packet 计数，不需要解码"""
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-count_packets',
+           '-show_entries', 'stream=width,height,nb_read_packets', '-of', 'json', path]
+    stream = json.loads(subprocess.check_output(cmd))['streams'][0]
+    return int(stream['nb_read_packets']), int(stream['width']), int(stream['height'])
+
+
+def decode_frames(path, frame_numbers):
+    """
+    解码 frame_numbers (从 1 开始，和 jpg 的编号一致) 中的帧，返回 {帧号: PIL.Image}
+    读到最后一个需要的帧就停止 ffmpeg；视频比 ffprobe 报的短时，缺的帧用最后一帧补
+    """
+    n_frames, width, height = probe_video(path)
+    out_width = int(round(width * FRAME_HEIGHT / height / 2)) * 2
+    frame_bytes = out_width * FRAME_HEIGHT * 3
+    wanted = set(frame_numbers)
+    last_wanted = max(wanted)
+    cmd = ['ffmpeg', '-v', 'error', '-i', path, '-vf', 'scale={}:{}'.format(out_width, FRAME_HEIGHT),
+           '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    frames = {}
+    last = None
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        for number in range(1, last_wanted + 1):
+            buffer = process.stdout.read(frame_bytes)
+            if len(buffer) < frame_bytes:
+                break
+            if number in wanted:
+                last = Image.fromarray(np.frombuffer(buffer, np.uint8).reshape(FRAME_HEIGHT, out_width, 3))
+                frames[number] = last
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+    if last is None:
+        raise Exception('Could not decode frames from {}'.format(path))
+    for number in wanted:
+        if number not in frames:
+            frames[number] = last
+    return frames
+
+
+class RawVideoDataset(data.Dataset):
+    """
+    Returns (snippets [seq_len x 3 x duration x H x W], audio [4096 x 32], path, error).
+    A video that fails to decode gives empty tensors and the error message instead of raising,
+    so one broken file does not stop a long prediction run.
+    """
+
+    def __init__(self, paths, spatial_transform, temporal_transform, need_audio=True, need_visual=True,
+                 n_tta_views=0):
+        self.paths = paths
+        self.spatial_transform = spatial_transform
+        self.temporal_transform = temporal_transform
+        self.tta = None
+        if n_tta_views > 0:
+            self.tta = MultiViewTransform(n_tta_views, spatial_transform.size, temporal_transform.seq_len,
+                                          temporal_transform.snippets_duration)
+        self.need_audio = need_audio
+        self.need_visual = need_visual
+
+    def __getitem__(self, index):
+        path = self.paths[index]
+        try:
+            snippets, audios = self.load(path)
+        except Exception as e:
+            return torch.zeros(0), torch.zeros(0), path, '{}: {}'.format(type(e).__name__, e)
+        return snippets, audios, path, ''
+
+    def load(self, path):
+        """解码一个视频 -> (snippets, audio)；失败时抛异常"""
+        snippets = self._load_snippets(path) if self.need_visual else torch.zeros(0)
+        audios = mfcc_timeseries(path) if self.need_audio else torch.zeros(0)
+        return snippets, audios
+
+    def _load_snippets(self, path):
+        n_frames = probe_video(path)[0]
+        if n_frames <= 0:
+            raise Exception('No frames in {}'.format(path))
+        if self.tta is not None:
+            views = self.tta.temporal_views(range(1, n_frames + 1))
+            return self.tta.build(views, decode_frames(path, self.tta.frame_numbers(views)))
+        snippets_frame_idx = self.temporal_transform(list(range(1, n_frames + 1)))
+        frames = decode_frames(path, [i for snippet in snippets_frame_idx for i in snippet])
+        self.spatial_transform.randomize_parameters()
+        snippets = []
+        for snippet_frame_idx in snippets_frame_idx:
+            snippet = [self.spatial_transform(frames[i]) for i in snippet_frame_idx]
+            snippets.append(torch.stack(snippet, 0).permute(1, 0, 2, 3))
+        return torch.stack(snippets, 0)
+
+    def __len__(self):
+        return len(self.paths)
+
+
+def collate_videos(items):
+    """把解码成功的样本拼成 batch；失败的只返回 (path, error)"""
+    ok = [item for item in items if item[3] == '']
+    failed = [(item[2], item[3]) for item in items if item[3] != '']
+    if len(ok) == 0:
+        return None, None, [], failed
+    visual = torch.stack([item[0] for item in ok])
+    audio = torch.stack([item[1] for item in ok])
+    return visual, audio, [item[2] for item in ok], failed
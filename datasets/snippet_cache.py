@@ -0,0 +1,59 @@
+import hashlib
+import os
+import warnings
+
+import numpy as np
+import torch
+
+
+def transform_signature(spatial_transform, temporal_transform, fps, aug_seed=-1, n_aug_views=0):
+    """
+    返回描述预处理配置的字符串；只有当空间/时间变换都是确定性的时候才能缓存，否则返回 None
+    随机增强在使用 counter_rng (aug_seed >= 0) 且视角数有限 (n_aug_views > 0) 时也是可复现的，同样可以缓存
+    """
+    if spatial_transform is None or temporal_transform is None:
+        return None
+    signature = '{}|{}|fps={}'.format(spatial_transform.cache_config(), temporal_transform.cache_config(), fps)
+    if getattr(spatial_transform, 'deterministic', False) and getattr(temporal_transform, 'deterministic', False):
+        return signature
+    if aug_seed >= 0 and n_aug_views > 0:
+        return '{}|aug_seed={}|n_aug_views={}'.format(signature, aug_seed, n_aug_views)
+    return None
+
+
+class SnippetCache(object):
+    """
+    Caches the final uint8 snippet tensor [seq_len x 3 x duration x H x W] of every video as a .npy file.
+    Files are keyed by video id and transform config, and read back with np.load(mmap_mode='r'),
+    so later epochs get a zero-copy view instead of decoding jpgs again.
+    """
+
+    def __init__(self, root, signature):
+        self.signature = signature
+        digest = hashlib.sha1(signature.encode('utf-8')).hexdigest()[:16]
+        self.root = os.path.join(root, digest)
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, 'config.txt'), 'w') as f:
+            f.write(signature)
+
+    def _path(self, video_id):
+        return os.path.join(self.root, '{}.npy'.format(video_id))
+
+    def get(self, video_id):
+        path = self._path(video_id)
+        if not os.path.exists(path):
+            return None
+        array = np.load(path, mmap_mode='r')
+        # the DataLoader collate copies into the batch tensor, so the read-only mmap is never written to
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return torch.from_numpy(array)
+
+    def put(self, video_id, snippets):
+        snippets = snippets.to(torch.uint8).numpy()
+        path = self._path(video_id)
+        # 多个 worker 可能同时写同一个视频，先写临时文件再原子替换
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.save(f, snippets)
+        os.replace(tmp_path, path)
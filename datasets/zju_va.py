@@ -10,6 +10,11 @@ import os
 import functools
 import librosa
 import numpy as np
+import random
+
+from datasets.snippet_cache import SnippetCache, transform_signature
+from transforms.rng import counter_rng
+from transforms.tta import MultiViewTransform
 
 
 def load_value_file(file_path):
@@ -85,6 +90,14 @@ def preprocess_audio(audio_path):
     mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=32)
     return mfccs
 
+
+def mfcc_timeseries(audio_path, timeseries_length=4096):
+    """MFCC [timeseries_length x 32]：不够长时循环补齐"""
+    feature = preprocess_audio(audio_path).T
+    k = timeseries_length // feature.shape[0] + 1
+    feature = np.tile(feature, reps=(k, 1))
+    return torch.FloatTensor(feature[:timeseries_length, :])
+
 # 以上会不会有重名函数的问题
 # 现在就是处理这里 把这里弄成正确输出的VA值
 import json
@@ -101,7 +114,14 @@ class zjuVADataset(data.Dataset):
                  temporal_transform=None,
                  target_transform=None,
                  get_loader=get_default_video_loader,
-                 need_audio=True):
+                 need_audio=True,
+                 need_visual=True,
+                 snippet_cache_path='',
+                 aug_seed=-1,
+                 n_aug_views=0,
+                 n_tta_views=0,
+                 n_folds=0,
+                 fold=0):
         # 加载标签文件 (假设是JSON格式)
         with open(annotation_path, 'r') as f:
             self.annotations = json.load(f)  # 加载整个JSON文件
@@ -115,7 +135,9 @@ class zjuVADataset(data.Dataset):
             audio_root_path=audio_path,
             subset=subset,
             fps=fps,
-            need_audio=need_audio
+            need_audio=need_audio,
+            n_folds=n_folds,
+            fold=fold
         )
 
         self.spatial_transform = spatial_transform
@@ -125,33 +147,89 @@ class zjuVADataset(data.Dataset):
         self.fps = fps
         self.ORIGINAL_FPS = 24
         self.need_audio = need_audio
+        self.need_visual = need_visual
+
+        # aug_seed >= 0 时增强参数由 (aug_seed, epoch, video_id) 决定，而不是全局 random
+        self.aug_seed = aug_seed
+        self.n_aug_views = n_aug_views
+        self.epoch = 0
+
+        # 只有可复现的预处理 (确定性变换，或有限个 counter_rng 增强视角) 才会启用缓存
+        self.snippet_cache = None
+        signature = transform_signature(spatial_transform, temporal_transform, fps, aug_seed, n_aug_views)
+        # n_tta_views > 0: 每个视频返回 n_tta_views 个确定性视角 [n_views, seq_len, ...]，帧只解码一次
+        self.tta = None
+        if n_tta_views > 0:
+            self.tta = MultiViewTransform(n_tta_views, spatial_transform.size, temporal_transform.seq_len,
+                                          temporal_transform.snippets_duration)
+            signature = '{}|fps={}'.format(self.tta.cache_config(), fps)
+        self.signature = signature
+        if snippet_cache_path != '' and signature is not None:
+            self.snippet_cache = SnippetCache(snippet_cache_path, signature)
 
     def __getitem__(self, index):
         data_item = self.data[index]
         video_path = data_item['video']
         frame_indices = data_item['frame_indices']
-        snippets_frame_idx = self.temporal_transform(frame_indices)
 
         # 音频处理
         if self.need_audio:
-            timeseries_length = 4096
-            audio_path = data_item['audio']
-            feature = preprocess_audio(audio_path).T
-            k = timeseries_length // feature.shape[0] + 1
-            feature = np.tile(feature, reps=(k, 1))
-            audios = feature[:timeseries_length, :]
-            audios = torch.FloatTensor(audios)
+            audios = mfcc_timeseries(data_item['audio'])
         else:
-            audios = []
+            # 空张量而不是 []，这样 default_collate 和 process_data_item 都能处理
+            audios = torch.zeros(0)
 
         # 处理视频片段
-        # TODO: 检查是否存在缓存文件
+        sample_id = data_item['video_id']  # 假设video_id对应SampleID
+        view = self.get_view()
+        cache_key = sample_id if view is None else '{}_view{}'.format(sample_id, view)
+        snippets = None
+        if not self.need_visual:
+            # audio-only: 不解码帧
+            snippets = torch.zeros(0)
+        elif self.snippet_cache is not None:
+            snippets = self.snippet_cache.get(cache_key)
+        if snippets is None:
+            rng = random if view is None else counter_rng(self.aug_seed, view, sample_id)
+            if self.tta is not None:
+                snippets = self._load_views(video_path, frame_indices)
+            else:
+                snippets = self._load_snippets(video_path, frame_indices, rng)
+            if self.snippet_cache is not None:
+                self.snippet_cache.put(cache_key, snippets)
+                snippets = snippets.to(torch.uint8)
+
+        # 获取目标标签 (Valence and Arousal) 从JSON标签文件
+        valence_value = self.valence.get(sample_id, 0)  # 默认为0，如果SampleID没有找到
+        arousal_value = self.arousal.get(sample_id, 0)  # 默认为0，如果SampleID没有找到
+
+        va_target = torch.tensor([valence_value, arousal_value])  # 将Valence和Arousal值作为标签
+
+        # 第二项是可复现输入的 key，供模型缓存冻结 backbone 的输出；不可复现时为空
+        feature_key = '' if self.signature is None else '{}/{}'.format(self.signature, cache_key)
+        visualization_item = [data_item['video_id'], feature_key]
+
+        return snippets, va_target, audios, visualization_item
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def get_view(self):
+        """当前 epoch 使用的增强视角编号；未启用 counter_rng 时返回 None"""
+        if self.aug_seed < 0:
+            return None
+        if self.n_aug_views > 0:
+            return self.epoch % self.n_aug_views
+        return self.epoch
+
+    def _load_snippets(self, video_path, frame_indices, rng=random):
+        snippets_frame_idx = self.temporal_transform(frame_indices, rng)
         snippets = []
         for snippet_frame_idx in snippets_frame_idx:
             snippet = self.loader(video_path, snippet_frame_idx)
             snippets.append(snippet)
 
-        self.spatial_transform.randomize_parameters()
+        self.spatial_transform.randomize_parameters(rng=rng)
         snippets_transformed = []
         for snippet in snippets:
             snippet = [self.spatial_transform(img) for img in snippet]
@@ -159,26 +237,22 @@ class zjuVADataset(data.Dataset):
             snippets_transformed.append(snippet)
         snippets = snippets_transformed
         snippets = torch.stack(snippets, 0)
-        
-        # TODO:缓存snippets，保存成pytorch的权重文件，调用torch.save()
-
-        # 获取目标标签 (Valence and Arousal) 从JSON标签文件
-        sample_id = data_item['video_id']  # 假设video_id对应SampleID
-        valence_value = self.valence.get(sample_id, 0)  # 默认为0，如果SampleID没有找到
-        arousal_value = self.arousal.get(sample_id, 0)  # 默认为0，如果SampleID没有找到
-
-        va_target = torch.tensor([valence_value, arousal_value])  # 将Valence和Arousal值作为标签
+        return snippets
 
-        visualization_item = [data_item['video_id']]
-
-        return snippets, va_target, audios, visualization_item
+    def _load_views(self, video_path, frame_indices):
+        views = self.tta.temporal_views(frame_indices)
+        numbers = self.tta.frame_numbers(views)
+        frames = dict(zip(numbers, self.loader(video_path, numbers)))
+        return self.tta.build(views, frames)
 
     def __len__(self):
         return len(self.data)
 
 import random
 # 增加split_ratio 和 seed 以便划分
-def make_dataset(video_root_path, annotation_path, audio_root_path, subset, fps=30, need_audio=True, split_ratio=0.8, seed=2025):
+# n_folds > 1 时改为 k 折划分：第 fold 折做 validation，其余做 training
+def make_dataset(video_root_path, annotation_path, audio_root_path, subset, fps=30, need_audio=True, split_ratio=0.8, seed=2025,
+                 n_folds=0, fold=0):
     # 加载标签文件
     with open(annotation_path, 'r') as f:
         annotations = json.load(f)  # 包含 Valence 和 Arousal 字段
@@ -238,6 +312,18 @@ def make_dataset(video_root_path, annotation_path, audio_root_path, subset, fps=
         dataset.append(sample)
     
     dataset_all = dataset
+    if n_folds > 1:
+        if not 0 <= fold < n_folds:
+            raise ValueError(f"fold must be in [0, {n_folds}), got {fold}")
+        # 先按 video_id 排序，划分不依赖 os.listdir 的顺序，同一 seed 下各折互不重叠且并起来是全集
+        dataset_all = sorted(dataset_all, key=lambda sample: sample['video_id'])
+        random.Random(seed).shuffle(dataset_all)
+        if subset == 'training':
+            return [sample for i, sample in enumerate(dataset_all) if i % n_folds != fold], video_dirs
+        elif subset == 'validation':
+            return dataset_all[fold::n_folds], video_dirs
+        raise ValueError(f"subset must be training | validation, got {subset}")
+
     train_len = int(len(dataset_all) * split_ratio)
     # 随机洗牌
     random.seed(seed)
@@ -0,0 +1,111 @@
+import argparse
+import csv
+import hashlib
+import os
+
+import torch
+from torch.utils.data import Subset
+
+from opts import parse_opts
+from core.model import generate_model, load_checkpoint, build_ensemble
+from core.utils import local2global_data_path, setup_device, calculate_accuracy, predict
+from core.dataset import get_evaluation_set, get_data_loader
+from core.prediction_cache import PredictionCache, file_digest, prediction_config
+from datasets.snippet_cache import transform_signature
+from models.resnet import kinetics_checkpoint_path
+
+METRICS = ['pcc', 'r2', 'mse']
+
+
+def weight_digests(opt, memo_dir):
+    """不在 checkpoint 里的权重 (冻结的 backbone 或 student) 的 digest"""
+    if opt.student_path != '':
+        return {'student': file_digest(opt.student_path, memo_dir)}
+    backbone_path = kinetics_checkpoint_path(opt.resnet101_pretrained, opt.resnet_depth)
+    if backbone_path == '':
+        raise Exception('The backbone would be randomly initialised, so its predictions cannot be cached')
+    return {'backbone': file_digest(backbone_path, memo_dir)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checkpoints', nargs='+', default=[], type=str,
+                        help='Checkpoints to evaluate (default: --checkpoint)')
+    # zju_va 没有独立的 test 集 (get_test_set 返回的也是 validation)，所以只提供 validation
+    parser.add_argument('--split', default='validation', type=str, choices=['validation'])
+    parser.add_argument('--prediction_cache_path', default='', type=str,
+                        help='Prediction cache directory (default: <result_path>/prediction_cache)')
+    parser.add_argument('--output', default='', type=str, help='Optional CSV of per-video predictions')
+    parser.add_argument('--ensemble', action='store_true',
+                        help='Evaluate the checkpoints as one ensemble sharing the frozen backbone pass')
+    args, argv = parser.parse_known_args()
+    opt = parse_opts(argv)
+    setup_device(opt)
+    local2global_data_path(opt)
+    if opt.dataset != 'zju_va':
+        raise Exception('evaluate supports the VA regression dataset zju_va only')
+    checkpoints = args.checkpoints if len(args.checkpoints) > 0 else [opt.checkpoint]
+    assert all(path != '' for path in checkpoints), '--checkpoint or --checkpoints is required'
+    cache_root = args.prediction_cache_path
+    if cache_root == '':
+        cache_root = os.path.join(opt.root_path, opt.result_path, 'prediction_cache')
+    os.makedirs(cache_root, exist_ok=True)
+
+    dataset = get_evaluation_set(opt)
+    video_ids = [item['video_id'] for item in dataset.data]
+    targets = torch.tensor([item['target'] for item in dataset.data], dtype=torch.float)
+    signature = transform_signature(dataset.spatial_transform, dataset.temporal_transform, opt.fps)
+    config = prediction_config(opt, '{}|{}'.format(args.split, signature), weight_digests(opt, cache_root))
+
+    # (名字, 参与的 checkpoint, cache 用的 digest)；ensemble 的 digest 由成员的 digest 组合而成
+    digests = [file_digest(checkpoint, cache_root) for checkpoint in checkpoints]
+    if args.ensemble:
+        ensemble_digest = hashlib.sha256('ensemble|{}'.format('|'.join(digests)).encode('utf-8')).hexdigest()
+        entries = [('ensemble of {}'.format(len(checkpoints)), checkpoints, ensemble_digest)]
+    else:
+        entries = [(checkpoint, [checkpoint], digest) for checkpoint, digest in zip(checkpoints, digests)]
+
+    base = None
+    rows = []
+    all_predictions = {}
+    for name, members, digest in entries:
+        cache = PredictionCache(cache_root, digest, config)
+        missing = [i for i, video_id in enumerate(video_ids) if cache.get(video_id) is None]
+        if len(missing) > 0:
+            # 只有需要计算时才构建模型
+            if base is None:
+                base, _ = generate_model(opt)
+            if args.ensemble:
+                model = build_ensemble(base, members)
+            else:
+                model = base
+                load_checkpoint(model, members[0])
+            loader = get_data_loader(opt, Subset(dataset, missing), shuffle=False)
+            preds, _, ids = predict(opt, model, loader)
+            cache.update({video_id: pred.tolist() for video_id, pred in zip(ids, preds)})
+
+        preds = torch.tensor([cache.get(video_id) for video_id in video_ids], dtype=torch.float)
+        all_predictions[name] = preds
+        scores = [calculate_accuracy(preds, targets, metric) for metric in METRICS]
+        rows.append((name, len(video_ids) - len(missing), len(missing), scores))
+
+    print('{:<60}{:>8}{:>10}'.format('checkpoint', 'cached', 'computed') + ''.join('{:>8}'.format(m) for m in METRICS))
+    for checkpoint, n_cached, n_computed, scores in rows:
+        print('{:<60}{:>8}{:>10}'.format(checkpoint[-60:], n_cached, n_computed) +
+              ''.join('{:>8.4f}'.format(score) for score in scores))
+
+    if args.output != '':
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['checkpoint', 'video_id', 'valence', 'arousal', 'target_valence', 'target_arousal'])
+            for checkpoint, preds in all_predictions.items():
+                for video_id, pred, target in zip(video_ids, preds.tolist(), targets.tolist()):
+                    writer.writerow([checkpoint, video_id] + pred + target)
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python evaluate.py --checkpoints /data/jjr/results/*/checkpoints/save_25.pth --split validation
+"""
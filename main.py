@@ -1,34 +1,41 @@
+import os
+
 from opts import parse_opts
 
 from core.model import generate_model
 from core.loss import get_loss
 from core.optimizer import get_optim
-from core.utils import local2global_path, get_spatial_transform
+from core.utils import local2global_path, get_spatial_transform, setup_device, get_grad_scaler, append_metrics
 from core.dataset import get_training_set, get_validation_set, get_test_set, get_data_loader
 
 from transforms.temporal import TSN
 from transforms.target import ClassLabel
 
-from train import train_epoch
-from validation import val_epoch
+from core.multi_head import build_training_heads
+from train import train_epoch, train_epoch_heads
+from validation import val_epoch, val_epoch_heads
 
 from torch.utils.data import DataLoader
-from torch.cuda import device_count
 
 from tensorboardX import SummaryWriter
 
 
 def main():
     opt = parse_opts()
-    opt.device_ids = list(range(device_count()))
+    setup_device(opt)
     local2global_path(opt)
     model, parameters = generate_model(opt)
 
-    criterion = get_loss(opt)
-    # criterion = criterion.cuda()
-    optimizer = get_optim(opt, parameters)
+    if opt.head_configs != '':
+        # 多 head 训练：各 head 有自己的 loss、optimizer、writer 和 checkpoint 目录
+        heads = build_training_heads(opt, model)
+    else:
+        criterion = get_loss(opt)
+        # criterion = criterion.cuda()
+        optimizer = get_optim(opt, parameters)
+        scaler = get_grad_scaler(opt)
 
-    writer = SummaryWriter(logdir=opt.log_path)
+        writer = SummaryWriter(logdir=opt.log_path)
 
     # train
     spatial_transform = get_spatial_transform(opt, 'train')
@@ -38,17 +45,34 @@ def main():
     train_loader = get_data_loader(opt, training_data, shuffle=True)
 
     # validation
-    spatial_transform = get_spatial_transform(opt, 'test')
-    temporal_transform = TSN(seq_len=opt.seq_len, snippet_duration=opt.snippet_duration, center=False)
+    spatial_transform = get_spatial_transform(opt, 'val' if opt.deterministic_val else 'test')
+    temporal_transform = TSN(seq_len=opt.seq_len, snippet_duration=opt.snippet_duration, center=opt.deterministic_val)
     target_transform = ClassLabel()
     validation_data = get_validation_set(opt, spatial_transform, temporal_transform, target_transform)
     val_loader = get_data_loader(opt, validation_data, shuffle=False)
 
     for i in range(1, opt.n_epochs + 1):
-        train_epoch(i, train_loader, model, criterion, optimizer, opt, training_data.class_names, writer)
-        val_epoch(i, val_loader, model, criterion, opt, writer, optimizer)
-
-    writer.close()
+        if hasattr(training_data, 'set_epoch'):
+            training_data.set_epoch(i)
+        if opt.head_configs != '':
+            train_epoch_heads(i, train_loader, heads, opt)
+            val_pccs = val_epoch_heads(i, val_loader, heads, opt)
+            for head, pcc in zip(heads, val_pccs):
+                head.best_pcc = max(head.best_pcc, pcc)
+                head_dir = os.path.dirname(head.opt.ckpt_path)
+                append_metrics(os.path.join(head_dir, 'metrics.jsonl'), {'epoch': i, 'val_pcc': pcc})
+        else:
+            train_epoch(i, train_loader, model, criterion, optimizer, opt, training_data.class_names, writer, scaler)
+            pcc = val_epoch(i, val_loader, model, criterion, opt, writer, optimizer)
+            append_metrics(os.path.join(opt.result_path, 'metrics.jsonl'), {'epoch': i, 'val_pcc': pcc})
+
+    if opt.head_configs != '':
+        print('{:<16}{:>12}'.format('head', 'best PCC'))
+        for head in heads:
+            print('{:<16}{:>12.4f}'.format(head.name, head.best_pcc))
+            head.writer.close()
+    else:
+        writer.close()
 
 
 if __name__ == "__main__":
@@ -56,4 +80,5 @@ if __name__ == "__main__":
 
 """
 python main.py --expr_name demo
+python main.py --expr_name lr_sweep --head_configs heads.json
 """
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""
+Fused attention pooling shared by VisualStream and VAANet.
+The weighted means are computed with bmm/einsum and broadcasting, so the [B x k x m] copies made
+by unsqueeze(...).repeat(...) and the intermediate products are never materialised.
+The submodules (sa_net, cwa_net, ta_net, aa_net) and their state_dict keys are unchanged.
+"""
+import torch
+
+
+def attention_pool(x: torch.Tensor, weights: torch.Tensor):
+    """mean(x * weights[:, None, :], dim=2): x [B x C x L], weights [B x L] -> [B x C]"""
+    return torch.bmm(x, weights.unsqueeze(2).to(x.dtype)).squeeze(2) / x.size(2)
+
+
+def spatial_channel_attention(F: torch.Tensor, sa_net, cwa_net):
+    """
+    F [B x k x m] -> fSC [B x k], As [B x m], Ac [B x k]
+    Same as fS = F * As; Ac = cwa_net(fS^T); fSC = mean(fS * Ac, dim=2), without building fS.
+    """
+    k, m = F.size(1), F.size(2)
+    Hs = sa_net['conv'](F)
+    Hs = torch.squeeze(Hs, dim=1)
+    Hs = sa_net['fc'](Hs)
+    As = sa_net['softmax'](Hs.float())  # softmax 始终用 fp32
+    As = torch.mul(As, m)
+
+    # cwa_net['conv'][0] 是 Conv1d(m, 1, 1)：对 fS^T 的卷积就是 F 按 As * w 在 m 上加权求和
+    conv = cwa_net['conv'][0]
+    Hc = torch.einsum('bkm,bm->bk', F, (As * conv.weight.view(1, m).float()).to(F.dtype))
+    Hc = cwa_net['conv'][1:](Hc.unsqueeze(1))  # BatchNorm1d + Tanh
+    Hc = torch.squeeze(Hc, dim=1)
+    Hc = cwa_net['fc'](Hc)
+    Ac = cwa_net['softmax'](Hc.float())
+    Ac = torch.mul(Ac, k)
+
+    fSC = Ac * attention_pool(F, As)
+    return fSC, As, Ac
+
+
+def sequence_attention(x: torch.Tensor, net):
+    """
+    Temporal / audio attention: x [B x C x L] -> pooled [B x C], A [B x L]
+    net is ta_net or aa_net (conv -> fc -> relu).
+    """
+    H = net['conv'](x)
+    H = torch.squeeze(H, dim=1)
+    H = net['fc'](H)
+    A = net['relu'](H)
+    return attention_pool(x, A), A
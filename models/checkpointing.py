@@ -0,0 +1,63 @@
+import contextlib
+import inspect
+
+import torch
+import torch.nn as nn
+from torch.utils.checkpoint import checkpoint
+
+# torch>=1.11 的 checkpoint 有 use_reentrant 参数；更早的版本只有 reentrant 实现
+_HAS_NON_REENTRANT = 'use_reentrant' in inspect.signature(checkpoint).parameters
+
+
+@contextlib.contextmanager
+def _frozen_bn_stats(module: nn.Module):
+    """保存并在退出时恢复 module 里所有 BatchNorm 的 running stats"""
+    saved = []
+    for m in module.modules():
+        if isinstance(m, nn.modules.batchnorm._BatchNorm) and m.track_running_stats and m.training:
+            saved.append((m, m.running_mean.clone(), m.running_var.clone(), m.num_batches_tracked.clone()))
+    try:
+        yield
+    finally:
+        with torch.no_grad():
+            for m, mean, var, count in saved:
+                m.running_mean.copy_(mean)
+                m.running_var.copy_(var)
+                m.num_batches_tracked.copy_(count)
+
+
+def _forward_once_stats(module: nn.Module):
+    """
+    第一次调用是正常的 forward；之后的调用是 backward 里的重算，BN 的 running stats 不再更新，
+    否则每一步会被更新两次。重算时 BN 仍用 batch 统计量归一化，输出与第一次相同
+    """
+    calls = [0]
+
+    def run(x):
+        calls[0] += 1
+        if calls[0] == 1:
+            return module(x)
+        with _frozen_bn_stats(module):
+            return module(x)
+
+    return run
+
+
+def run_sequential(modules: nn.Sequential, x: torch.Tensor, use_checkpoint: bool):
+    """
+    Runs the children of an nn.Sequential one after another. With use_checkpoint, every child is
+    wrapped in activation checkpointing: its activations are recomputed in backward instead of stored.
+    The RNG state is preserved for the recompute and BatchNorm running stats are updated only once per step.
+    """
+    if not use_checkpoint or not torch.is_grad_enabled():
+        return modules(x)
+    if not _HAS_NON_REENTRANT and not x.requires_grad:
+        # reentrant 版本在输入不需要梯度时 (来自冻结的前缀) 不会给参数传梯度
+        x = x.detach().requires_grad_()
+    for module in modules:
+        if _HAS_NON_REENTRANT:
+            # 非 reentrant 版本：输入不需要梯度时参数也能拿到梯度
+            x = checkpoint(_forward_once_stats(module), x, use_reentrant=False, preserve_rng_state=True)
+        else:
+            x = checkpoint(_forward_once_stats(module), x, preserve_rng_state=True)
+    return x
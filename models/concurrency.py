@@ -0,0 +1,56 @@
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+
+def _autocast_context():
+    """
+    autocast 和 grad mode 都是线程局部的：把调用线程的 autocast 状态复制到工作线程
+    """
+    if hasattr(torch, 'get_autocast_dtype'):  # torch>=2.4
+        for device_type in ('cuda', 'cpu'):
+            if torch.is_autocast_enabled(device_type):
+                return torch.autocast(device_type=device_type, dtype=torch.get_autocast_dtype(device_type))
+    elif hasattr(torch, 'autocast'):
+        if torch.is_autocast_enabled():
+            return torch.autocast(device_type='cuda', dtype=torch.get_autocast_gpu_dtype())
+        if torch.is_autocast_cpu_enabled():
+            return torch.autocast(device_type='cpu', dtype=torch.get_autocast_cpu_dtype())
+    return contextlib.nullcontext()
+
+
+class BranchRunner(object):
+    """
+    Runs one model branch on a dedicated worker thread with its own intra-op thread budget.
+    torch ops release the GIL, so the branch overlaps with whatever the calling thread computes.
+    """
+
+    def __init__(self, n_threads):
+        self.n_threads = n_threads
+        caller_threads = torch.get_num_threads()
+        self.executor = ThreadPoolExecutor(max_workers=1, initializer=self._init_worker)
+        # 先让工作线程完成初始化，再恢复调用线程的设置 (见 _init_worker)
+        self.executor.submit(lambda: None).result()
+        torch.set_num_threads(caller_threads)
+
+    def _init_worker(self):
+        if self.n_threads > 0:
+            # torch.set_num_threads 不是线程局部的：除了当前线程的 OpenMP 线程数，还会改整个进程的
+            # MKL 线程数和 intra-op 线程池大小，所以 __init__ 之后调用线程会把这些改回自己的值。
+            # 最终只有这个线程的 OpenMP 线程数 (线程局部) 是 n_threads，MKL 调用在两个线程里都用调用线程的线程数
+            torch.set_num_threads(self.n_threads)
+
+    def worker_threads(self):
+        """工作线程里 torch.get_num_threads() 的值，用于确认线程预算"""
+        return self.executor.submit(torch.get_num_threads).result()
+
+    def submit(self, fn, *args):
+        grad_enabled = torch.is_grad_enabled()
+        autocast = _autocast_context()
+
+        def run():
+            with torch.set_grad_enabled(grad_enabled), autocast:
+                return fn(*args)
+
+        return self.executor.submit(run)
@@ -0,0 +1,28 @@
+import torch
+import torch.nn as nn
+
+
+class VAANetEnsemble(nn.Module):
+    """
+    Ensemble of K VAANet checkpoints that share one frozen backbone.
+    The frozen prefix runs once per batch; its output is fanned out to every member's fine-tuned stages,
+    attention heads, audio branch and av_fc. Outputs and attention maps are averaged over the members,
+    so the ensemble is a drop-in replacement for VAANet at inference.
+    """
+
+    def __init__(self, members):
+        super(VAANetEnsemble, self).__init__()
+        shared = members[0].resnet
+        for member in members[1:]:
+            member.resnet = shared
+        self.members = nn.ModuleList(members)
+
+    @property
+    def modality(self):
+        return self.members[0].modality
+
+    def forward(self, visual: torch.Tensor, audio: torch.Tensor, keys=None):
+        prefix = self.members[0].shared_prefix(visual, keys) if self.modality != 'audio' else None
+        outputs = [member(visual, audio, prefix=prefix) for member in self.members]
+        return tuple(torch.stack(values).mean(dim=0) for values in zip(*outputs))
+
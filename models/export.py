@@ -0,0 +1,66 @@
+"""
+Export-friendly wrapper of a trained VAANet for a fixed seq_len / snippet_duration / sample_size.
+Preprocessing is part of the graph: the visual input is the raw uint8 snippet tensor produced by the
+dataset's spatial transform (before normalisation), the audio input is the MFCC matrix.
+The wrapper has no Python-side state (prefix cache, branch runner, modality switches, chunking), calls the
+encoder without the inference_mode wrapper, and only uses out-of-place ops, so it traces to TorchScript
+and ONNX.
+"""
+import torch
+import torch.nn as nn
+
+
+class ExportableVAANet(nn.Module):
+    """
+    visual [batch, seq_len, 3, duration, H, W] uint8 (0-255), audio [batch, 4096, 32] float
+    -> va [batch, 2], gamma [batch, seq_len]
+    """
+
+    def __init__(self, model):
+        super(ExportableVAANet, self).__init__()
+        if model.modality != 'av':
+            raise Exception('Only audio-visual models can be exported, got modality={}'.format(model.modality))
+        self.model = model
+        self.encoder = nn.Sequential(model.resnet.backbone, model.resnet_ft)
+        self.norm_value = model.NORM_VALUE
+        self.mean = model.MEAN
+        self.eval()
+
+    def forward(self, visual: torch.Tensor, audio: torch.Tensor):
+        clips = visual.transpose(0, 1).flatten(0, 1).float()
+        clips = clips / self.norm_value - self.mean
+        F = self.encoder(clips)
+        if self.model.feature_pool is not None:
+            F = self.model.feature_pool(F)
+        F = torch.flatten(F, start_dim=2)
+        fSCT, _, _, gamma = self.model._visual_heads(F)
+        fA = self.model._audio_branch(audio)
+        output = self.model.av_fc(torch.cat([fSCT, fA], dim=1))
+        return output, gamma
+
+
+def example_inputs(opt, batch_size=1):
+    visual = torch.randint(0, 256, (batch_size, opt.seq_len, 3, opt.snippet_duration, opt.sample_size,
+                                    opt.sample_size), dtype=torch.uint8, device=opt.device)
+    audio = torch.randn(batch_size, 4096, 32, device=opt.device)
+    return visual, audio
+
+
+def export_torchscript(wrapper, inputs, path):
+    with torch.no_grad():
+        traced = torch.jit.trace(wrapper, inputs)
+        if hasattr(torch.jit, 'freeze'):
+            traced = torch.jit.freeze(traced)
+    traced.save(path)
+    return traced
+
+
+def export_onnx(wrapper, inputs, path, opset_version=14):
+    # batch 维是动态的，其余维度在导出时固定
+    with torch.no_grad():
+        torch.onnx.export(wrapper, inputs, path,
+                          input_names=['visual', 'audio'],
+                          output_names=['va', 'gamma'],
+                          dynamic_axes={'visual': {0: 'batch'}, 'audio': {0: 'batch'},
+                                        'va': {0: 'batch'}, 'gamma': {0: 'batch'}},
+                          opset_version=opset_version)
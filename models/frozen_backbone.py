@@ -0,0 +1,117 @@
+from collections import OrderedDict
+
+import torch
+import torch.nn as nn
+
+
+def fuse_conv_bn(conv, bn):
+    """Folds an eval-mode BatchNorm into the preceding convolution: y = bn(conv(x)) = conv'(x)."""
+    fused = type(conv)(conv.in_channels, conv.out_channels, conv.kernel_size, stride=conv.stride,
+                       padding=conv.padding, dilation=conv.dilation, groups=conv.groups, bias=True)
+    scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+    conv_bias = conv.bias if conv.bias is not None else torch.zeros_like(bn.running_mean)
+    shape = [-1] + [1] * (conv.weight.dim() - 1)
+    with torch.no_grad():
+        fused.weight.copy_(conv.weight * scale.view(shape))
+        fused.bias.copy_((conv_bias - bn.running_mean) * scale + bn.bias)
+    return fused
+
+
+def fold_batch_norms(module):
+    """
+    Recursively replaces every (Conv, BatchNorm) pair by a single biased Conv and an Identity.
+    Pairs are found as consecutive children of an nn.Sequential (stem, downsample) or as the
+    convN/bnN attributes of a residual block.
+    """
+    conv_types = (nn.Conv1d, nn.Conv2d, nn.Conv3d)
+    bn_types = (nn.BatchNorm1d, nn.BatchNorm2d, nn.BatchNorm3d)
+    if isinstance(module, nn.Sequential):
+        names = [name for name, _ in module.named_children()]
+        for name, next_name in zip(names[:-1], names[1:]):
+            conv, bn = module._modules[name], module._modules[next_name]
+            if isinstance(conv, conv_types) and isinstance(bn, bn_types):
+                module._modules[name] = fuse_conv_bn(conv, bn)
+                module._modules[next_name] = nn.Identity()
+    else:
+        i = 1
+        while hasattr(module, 'conv{}'.format(i)) and hasattr(module, 'bn{}'.format(i)):
+            conv, bn = getattr(module, 'conv{}'.format(i)), getattr(module, 'bn{}'.format(i))
+            if isinstance(conv, conv_types) and isinstance(bn, bn_types):
+                setattr(module, 'conv{}'.format(i), fuse_conv_bn(conv, bn))
+                setattr(module, 'bn{}'.format(i), nn.Identity())
+            i += 1
+    for child in module.children():
+        fold_batch_norms(child)
+    return module
+
+
+def _autocast_enabled():
+    if hasattr(torch, 'is_autocast_cpu_enabled'):  # torch>=1.10
+        return torch.is_autocast_enabled() or torch.is_autocast_cpu_enabled()
+    return False
+
+
+class FrozenBackbone(nn.Module):
+    """
+    Inference-only wrapper of the frozen 3D ResNet encoder.
+    BN layers are folded into the convolutions at construction, the module ignores model.train()
+    and runs under torch.inference_mode, so its outputs are deterministic and no running stats move.
+    """
+
+    def __init__(self, backbone):
+        super(FrozenBackbone, self).__init__()
+        backbone.eval()
+        self.backbone = fold_batch_norms(backbone)
+        for param in self.backbone.parameters():
+            param.requires_grad = False
+        self.backbone.eval()
+
+    def train(self, mode=True):
+        # 始终保持 eval 模式
+        return super(FrozenBackbone, self).train(False)
+
+    def output_dtype(self, input_dtype):
+        """forward 输出的 dtype：autocast 下是 backbone 的 dtype (--amp 时为低精度)，否则与输入相同"""
+        weight = next(self.backbone.parameters(), None)
+        if weight is None or not weight.is_floating_point() or not _autocast_enabled():
+            return input_dtype
+        return weight.dtype
+
+    def forward(self, x):
+        # --amp 时 backbone 以低精度保存；不在 autocast 里的调用 (streaming、benchmark) 也要先把输入转成同样的 dtype
+        weight = next(self.backbone.parameters(), None)
+        out_dtype = self.output_dtype(x.dtype)
+        if weight is not None and weight.is_floating_point():
+            x = x.to(weight.dtype)
+        no_grad = torch.inference_mode if hasattr(torch, 'inference_mode') else torch.no_grad
+        with no_grad():
+            x = self.backbone(x)
+        # inference tensor 不能参与后面的 autograd，clone 成普通张量
+        if hasattr(x, 'is_inference') and x.is_inference():
+            x = x.clone()
+        return x.to(out_dtype)
+
+
+class FeatureCache(object):
+    """
+    In-memory LRU cache of frozen-prefix outputs [seq_len x C x T x H x W], keyed by the dataset's
+    feature key (video id + reproducible view). Entries are kept on CPU in the dtype the backbone produced,
+    so cache hits and misses give the same numerics.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        # copy=True: 在 CPU 上也复制，不让一个 entry 引用整个 batch 的输出
+        self.entries[key] = value.detach().to('cpu', copy=True)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
@@ -0,0 +1,120 @@
+"""
+INT8 post-training quantization of VAANet for CPU inference.
+The 3D ResNet encoder and the audio ResNet-18 are statically quantized with FX graph mode: the residual adds
+are handled without editing the blocks, and observers are calibrated by running the model on real batches.
+The Linear layers of the attention heads and the fusion layers are dynamically quantized (int8 weights,
+activations quantized on the fly). Both need torch>=1.13 (torch.ao.quantization with QConfigMapping).
+"""
+import inspect
+import operator
+
+import torch
+import torch.nn as nn
+
+# 动态量化的 Linear 所在的子模块 (aa_net 的 fc 只有 audio_n_segments x audio_n_segments，不值得量化)
+DYNAMIC_QUANT_MODULES = ['sa_net', 'cwa_net', 'ta_net', 'a_fc', 'av_fc']
+
+
+def _ao_quantization():
+    if not hasattr(torch, 'ao') or not hasattr(torch.ao, 'quantization') or \
+            not hasattr(torch.ao.quantization, 'get_default_qconfig_mapping'):
+        raise Exception('INT8 quantization needs torch>=1.13')
+    import torch.ao.quantization.quantize_fx
+    return torch.ao.quantization
+
+
+def default_quant_engine():
+    """x86 (fbgemm 的后继) > fbgemm > qnnpack (ARM)"""
+    engines = torch.backends.quantized.supported_engines
+    for engine in ['x86', 'fbgemm', 'qnnpack']:
+        if engine in engines:
+            return engine
+    raise Exception('No quantized engine available, supported: {}'.format(engines))
+
+
+def _trace_residual_blocks(module):
+    """
+    symbolic_trace，并把残差块里的 `out += residual` 换成 out-of-place add，
+    这样 prepare_fx 能按 add 的规则量化它 (iadd 没有对应的量化 pattern)
+    """
+    graph_module = torch.fx.symbolic_trace(module)
+    for node in graph_module.graph.nodes:
+        if node.op == 'call_function' and node.target is operator.iadd:
+            node.target = operator.add
+    graph_module.recompile()
+    return graph_module
+
+
+def prepare_static(model, visual, audio, engine):
+    """
+    Inserts observers into the encoder and the audio ResNet-18 (in place).
+    visual/audio is an example batch used for tracing; afterwards run the model on calibration batches
+    and call convert_static.
+    """
+    if getattr(model, 'student_path', '') != '':
+        raise Exception('Static quantization supports the 3D ResNet encoder only, not a student backbone')
+    ao = _ao_quantization()
+    torch.backends.quantized.engine = engine
+    qconfig_mapping = ao.get_default_qconfig_mapping(engine)
+    model.eval()
+
+    # 冻结前缀 (BN 已折叠) 和 fine-tune 过的 stage 合成一个网络一起量化，resnet_ft 置空
+    encoder = nn.Sequential(*list(model.resnet.backbone.children()), *list(model.resnet_ft.children())).eval()
+    clips = model._normalize(visual.transpose(0, 1).flatten(0, 1)[:1])
+    model.resnet.backbone = ao.quantize_fx.prepare_fx(_trace_residual_blocks(encoder), qconfig_mapping, (clips,))
+    model.resnet_ft = nn.Sequential()
+
+    segments = audio[:1].view(model.audio_n_segments, -1, audio.size(2))[:1].unsqueeze(1)
+    model.a_resnet = ao.quantize_fx.prepare_fx(_trace_residual_blocks(model.a_resnet.eval()), qconfig_mapping,
+                                               (segments,))
+    return model
+
+
+def convert_static(model):
+    ao = _ao_quantization()
+    model.resnet.backbone = ao.quantize_fx.convert_fx(model.resnet.backbone)
+    model.a_resnet = ao.quantize_fx.convert_fx(model.a_resnet)
+    return model
+
+
+def quantize_dynamic_heads(model):
+    """把 sa_net / cwa_net / ta_net / a_fc / av_fc 里的 nn.Linear 换成动态量化的 int8 Linear (in place)"""
+    ao = _ao_quantization()
+    return ao.quantize_dynamic(model, qconfig_spec=set(DYNAMIC_QUANT_MODULES), dtype=torch.qint8, inplace=True)
+
+
+def quantize_model(model, calibration_batches, engine=None):
+    """
+    Static INT8 quantization of both ResNets calibrated on calibration_batches (an iterable of
+    (visual, audio) CPU tensors), then dynamic quantization of the head Linears. Modifies model in place.
+    """
+    engine = default_quant_engine() if engine is None else engine
+    calibration_batches = list(calibration_batches)
+    if len(calibration_batches) == 0:
+        raise Exception('Quantization needs at least one calibration batch')
+    # 校准时两个分支都要跑，且不用并发线程
+    modality, model.modality, model.audio_runner = model.modality, 'av', None
+    prepare_static(model, *calibration_batches[0], engine=engine)
+    with torch.no_grad():
+        for visual, audio in calibration_batches:
+            model(visual, audio)
+    convert_static(model)
+    quantize_dynamic_heads(model)
+    model.modality = modality
+    model.quant_engine = engine
+    return model
+
+
+def save_quantized_model(model, path):
+    """量化后的 GraphModule 没有对应的构造参数，所以整个模型对象一起保存"""
+    runner, model.audio_runner = model.audio_runner, None  # 线程池不能 pickle
+    torch.save(model, path)
+    model.audio_runner = runner
+
+
+def load_quantized_model(path):
+    kwargs = {'weights_only': False} if 'weights_only' in inspect.signature(torch.load).parameters else {}
+    model = torch.load(path, map_location='cpu', **kwargs)
+    torch.backends.quantized.engine = model.quant_engine
+    model.eval()
+    return model
@@ -3,6 +3,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 from functools import partial
 import math
+import os
 
 
 def conv3x3x3(in_planes, out_planes, stride=1):
@@ -17,6 +18,47 @@ def conv3x3x3(in_planes, out_planes, stride=1):
     )
 
 
+def downsample_basic_block(x, planes, stride):
+    # shortcut type A: strided identity padded with zero channels (used by the Kinetics ResNet-18/34)
+    out = F.avg_pool3d(x, kernel_size=1, stride=stride)
+    zero_pads = out.new_zeros(out.size(0), planes - out.size(1), out.size(2), out.size(3), out.size(4))
+    return torch.cat([out, zero_pads], dim=1)
+
+
+class BasicBlock(nn.Module):
+    expansion = 1
+
+    def __init__(self, in_planes, planes, stride=1, downsample=None):
+        super(BasicBlock, self).__init__()
+        self.stride = stride
+
+        self.conv1 = conv3x3x3(in_planes, planes, stride)
+        self.bn1 = nn.BatchNorm3d(planes)
+        self.conv2 = conv3x3x3(planes, planes)
+        self.bn2 = nn.BatchNorm3d(planes)
+        self.relu = nn.ReLU(inplace=True)
+
+        self.downsample = downsample
+
+    def forward(self, x):
+        residual = x
+
+        out = self.conv1(x)
+        out = self.bn1(out)
+        out = self.relu(out)
+
+        out = self.conv2(out)
+        out = self.bn2(out)
+
+        if self.downsample is not None:
+            residual = self.downsample(x)
+
+        out += residual
+        out = self.relu(out)
+
+        return out
+
+
 class Bottleneck(nn.Module):
     expansion = 4
 
@@ -93,7 +135,7 @@ class ResNet(nn.Module):
         # downsample case
         if stride != 1 or self.in_planes != planes * block.expansion:
             if shortcut_type == 'A':
-                assert True, 'Not implemented!'
+                downsample = partial(downsample_basic_block, planes=planes * block.expansion, stride=stride)
             else:
                 downsample = nn.Sequential(
                     nn.Conv3d(self.in_planes, planes * block.expansion, kernel_size=1, stride=stride, bias=False),
@@ -125,26 +167,98 @@ class ResNet(nn.Module):
         return x
 
 
-def resnet101(n_classes, sample_duration, sample_size):
-    """Constructs a 3D ResNet-101 model."""
-    model = ResNet(block=Bottleneck, layers=[3, 4, 23, 3], shortcut_type='B', num_classes=n_classes,
+# depth -> (block, layers, shortcut_type), 与 Kinetics 预训练模型的结构一致
+RESNET_CONFIGS = {
+    18: (BasicBlock, [2, 2, 2, 2], 'A'),
+    34: (BasicBlock, [3, 4, 6, 3], 'A'),
+    50: (Bottleneck, [3, 4, 6, 3], 'B'),
+    101: (Bottleneck, [3, 4, 23, 3], 'B'),
+}
+
+
+def resnet(depth, n_classes, sample_duration, sample_size):
+    """Constructs a 3D ResNet-{18, 34, 50, 101} model."""
+    block, layers, shortcut_type = RESNET_CONFIGS[depth]
+    model = ResNet(block=block, layers=layers, shortcut_type=shortcut_type, num_classes=n_classes,
                    sample_duration=sample_duration, sample_size=sample_size)
     return model
 
 
+def resnet18(n_classes, sample_duration, sample_size):
+    """Constructs a 3D ResNet-18 model."""
+    return resnet(18, n_classes, sample_duration, sample_size)
+
+
+def resnet34(n_classes, sample_duration, sample_size):
+    """Constructs a 3D ResNet-34 model."""
+    return resnet(34, n_classes, sample_duration, sample_size)
+
+
+def resnet50(n_classes, sample_duration, sample_size):
+    """Constructs a 3D ResNet-50 model."""
+    return resnet(50, n_classes, sample_duration, sample_size)
+
+
+def resnet101(n_classes, sample_duration, sample_size):
+    """Constructs a 3D ResNet-101 model."""
+    return resnet(101, n_classes, sample_duration, sample_size)
+
+
+def resnet_out_channels(depth):
+    block, _, _ = RESNET_CONFIGS[depth]
+    return 512 * block.expansion
+
+
+def resnet_feature_size(snippet_duration, sample_size):
+    """layer4 输出的 (T', H', W')：时间维下采样 16 倍，空间维 32 倍，都向上取整 (与 ResNet.avgpool 一致)"""
+    last_duration = int(math.ceil(snippet_duration / 16))
+    last_size = int(math.ceil(sample_size / 32))
+    return last_duration, last_size, last_size
+
+
+def kinetics_checkpoint_path(resnet101_path, depth):
+    """
+    其他深度的 Kinetics 模型放在 resnet-101-kinetics.pth 同一目录下: resnet-{depth}-kinetics.pth
+    只有显式传入 --resnet101_pretrained '' 时返回 ''，backbone 随机初始化 (benchmark 用)；
+    文件不存在时报错，否则冻结的随机 backbone 会让模型在噪声特征上训练
+    """
+    if resnet101_path == '':
+        return ''
+    if depth == 101:
+        path = resnet101_path
+    else:
+        path = os.path.join(os.path.dirname(resnet101_path), 'resnet-{}-kinetics.pth'.format(depth))
+    if not os.path.exists(path):
+        raise FileNotFoundError('Pretrained Kinetics 3D ResNet-{} not found at {} '
+                                "(pass --resnet101_pretrained '' to use a random backbone)".format(depth, path))
+    return path
+
+
 def pretrained_resnet101(snippet_duration: int,
                          sample_size: int,
                          n_classes=8,
                          ft_begin_index=5,
                          pretrained_resnet101_path="/home/jjr/srtp/VAANet-master/data/resnet-101-kinetics.pth"):
+    return pretrained_resnet(101, snippet_duration, sample_size, n_classes, ft_begin_index, pretrained_resnet101_path)
+
+
+def pretrained_resnet(depth: int,
+                      snippet_duration: int,
+                      sample_size: int,
+                      n_classes=8,
+                      ft_begin_index=5,
+                      pretrained_path=''):
     n_finetune_classes = 400
-    model = resnet101(n_classes, snippet_duration, sample_size)
-    model = model.cuda()
-    print('Loading pretrained 3D ResNet-101 {}'.format(pretrained_resnet101_path))
-    pretrain = torch.load(pretrained_resnet101_path)
+    model = resnet(depth, n_classes, snippet_duration, sample_size)
+    if pretrained_path == '':
+        # 只用于 benchmark 等不关心权重的场景 (--resnet101_pretrained '')
+        print('3D ResNet-{} is randomly initialised (no pretrained Kinetics model)'.format(depth))
+        return model, get_fine_tuning_parameters(model, ft_begin_index)
+    print('Loading pretrained 3D ResNet-{} {}'.format(depth, pretrained_path))
+    # 先在 CPU 上加载，generate_model 再统一搬到 opt.device
+    pretrain = torch.load(pretrained_path, map_location='cpu')
     # ---------------------------------------------------------------- #
     model.fc = nn.Linear(model.fc.in_features, n_finetune_classes)
-    model.fc = model.fc.cuda()
     # ---------------------------------------------------------------- #
     from collections import OrderedDict
     new_state_dict = OrderedDict()
@@ -155,7 +269,6 @@ def pretrained_resnet101(snippet_duration: int,
     model.load_state_dict(new_state_dict)
     # ---------------------------------------------------------------- #
     model.fc = nn.Linear(model.fc.in_features, n_classes)
-    model.fc = model.fc.cuda()
     parameters = get_fine_tuning_parameters(model, ft_begin_index)
     return model, parameters
 
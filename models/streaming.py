@@ -0,0 +1,79 @@
+import contextlib
+from collections import deque
+
+import torch
+
+from models.attention import sequence_attention
+
+
+class StreamingVAANet(object):
+    """
+    Streaming wrapper around a trained VAANet for long or live videos.
+    Snippets and audio segments are pushed as they arrive; the backbone runs once per new snippet
+    and the ResNet-18 once per new audio segment. Only the last seq_len snippet features and the
+    last audio_n_segments audio embeddings are kept, in ring buffers, so memory is bounded and the
+    cost per new snippet is constant. Every new snippet emits the VA of the current window.
+    """
+
+    def __init__(self, model, device, autocast_dtype=None):
+        self.model = model.eval()
+        self.device = device
+        # 与 core.utils.infer 一样在 autocast 下计算 (--amp 时传入对应的 dtype)
+        self.autocast_dtype = autocast_dtype
+        self.snippet_features = deque(maxlen=model.seq_len)
+        self.audio_embeddings = deque(maxlen=model.audio_n_segments)
+
+    def _autocast(self):
+        if self.autocast_dtype is None:
+            return contextlib.nullcontext()
+        if not hasattr(torch, 'autocast'):
+            raise Exception('--amp needs torch>=1.10')
+        return torch.autocast(device_type=self.device.type, dtype=self.autocast_dtype)
+
+    def reset(self):
+        self.snippet_features.clear()
+        self.audio_embeddings.clear()
+
+    @torch.no_grad()
+    def push_audio_segment(self, segment: torch.Tensor):
+        """MFCC 段 [rows x 32] (训练时每段 4096 / audio_n_segments 行)"""
+        segment = segment.to(self.device).unsqueeze(0)
+        with self._autocast():
+            self.audio_embeddings.append(self.model._audio_segment_embeddings(segment)[0])
+
+    @torch.no_grad()
+    def push_snippet(self, snippet: torch.Tensor):
+        """
+        snippet: [3 x snippet_duration x H x W]，取值 0-255 (与数据集输出一致)
+        返回当前窗口的 (output [2], gamma [n_snippets])；还没有音频时返回 None
+        """
+        clip = snippet.to(self.device).float().unsqueeze(0)
+        with self._autocast():
+            self.snippet_features.append(self.model._clip_features(clip)[0])
+            if len(self.audio_embeddings) == 0:
+                return None
+            output, gamma = self._window_output()
+        return output.float(), gamma.float()
+
+    def _window_output(self):
+        model = self.model
+        # 窗口没填满时像数据集的 LoopPadding / np.tile 一样循环补齐
+        snippets = _loop_pad(list(self.snippet_features), model.seq_len)
+        F = torch.stack(snippets, dim=0)  # [seq_len x nc x m]，batch = 1
+        fSCT, _, _, gamma = model._visual_heads(F)
+
+        embeddings = _loop_pad(list(self.audio_embeddings), model.audio_n_segments)
+        audio = torch.stack(embeddings, dim=1).unsqueeze(0)  # [1 x 256 x n_segments]
+        fA, _ = sequence_attention(audio, model.aa_net)
+
+        output = model.av_fc(torch.cat([fSCT, fA], dim=1))
+        return output[0], gamma[0, :len(self.snippet_features)]
+
+
+def _loop_pad(items, size):
+    out = list(items)
+    for item in items * size:
+        if len(out) >= size:
+            break
+        out.append(item)
+    return out
@@ -0,0 +1,54 @@
+import torch
+import torch.nn as nn
+import torchvision
+
+
+class StudentBackbone(nn.Module):
+    """
+    Lightweight stand-in for the 3D ResNet encoder, trained by tools/distill_student to reproduce its
+    features. A 2D ResNet-18 runs on n_frames frames sampled uniformly from each clip, the frame maps are
+    averaged over time, projected to nc channels and pooled to the teacher's T' x H' x W'.
+    [n_clips, 3, duration, H, W] -> [n_clips, nc, T', H', W']
+    """
+
+    def __init__(self, nc, feature_size, n_frames=4, pretrained=True):
+        super(StudentBackbone, self).__init__()
+        self.nc = nc
+        self.feature_size = tuple(feature_size)
+        self.n_frames = n_frames
+        resnet = torchvision.models.resnet18(pretrained=pretrained)
+        # 去掉 avgpool 和 fc，保留 stride 32 的特征图 (112px 输入时为 4 x 4，与 3D ResNet 一致)
+        self.trunk = nn.Sequential(*list(resnet.children())[:-2])
+        self.proj = nn.Sequential(
+            nn.Conv3d(512, nc, kernel_size=1, bias=False),
+            nn.BatchNorm3d(nc),
+            nn.ReLU(inplace=True),
+        )
+        self.pool = nn.AdaptiveAvgPool3d(self.feature_size)
+
+    def forward(self, clips: torch.Tensor):
+        n, c, duration, h, w = clips.shape
+        index = torch.linspace(0, duration - 1, self.n_frames, device=clips.device).round().long()
+        frames = clips.index_select(2, index).transpose(1, 2).flatten(0, 1)  # [n * n_frames, 3, H, W]
+        x = self.trunk(frames)
+        x = x.view(n, self.n_frames, *x.shape[1:]).mean(dim=1, keepdim=True)  # 时间维平均池化
+        x = x.transpose(1, 2)  # [n, 512, 1, h', w']
+        x = self.proj(x)
+        return self.pool(x)
+
+
+def save_student(student, path):
+    torch.save({
+        'nc': student.nc,
+        'feature_size': student.feature_size,
+        'n_frames': student.n_frames,
+        'state_dict': student.state_dict(),
+    }, path)
+
+
+def load_student(path):
+    """读取 save_student 保存的 student；结构参数保存在文件里，和训练时保持一致"""
+    states = torch.load(path, map_location='cpu')
+    student = StudentBackbone(states['nc'], states['feature_size'], states['n_frames'], pretrained=False)
+    student.load_state_dict(states['state_dict'])
+    return student
@@ -2,6 +2,9 @@ import torch
 import torch.nn as nn
 import torchvision
 from models.visual_stream import VisualStream
+from models.checkpointing import run_sequential
+from models.attention import sequence_attention
+from models.concurrency import BranchRunner
 
 
 class VAANet(VisualStream):
@@ -12,21 +15,43 @@ class VAANet(VisualStream):
                  seq_len=10,
                  pretrained_resnet101_path='',
                  audio_embed_size=256,
-                 audio_n_segments=16,):
+                 audio_n_segments=16,
+                 backbone_chunk_size=0,
+                 ft_begin_index=5,
+                 grad_checkpoint=False,
+                 prefix_cache_size=0,
+                 resnet_depth=101,
+                 feature_grid=0,
+                 modality='av',
+                 modality_dropout=0.0,
+                 student_path=''):
         super(VAANet, self).__init__(
             snippet_duration=snippet_duration,
             sample_size=sample_size,
             n_classes=n_classes,
             seq_len=seq_len,
-            pretrained_resnet101_path=pretrained_resnet101_path
+            pretrained_resnet101_path=pretrained_resnet101_path,
+            backbone_chunk_size=backbone_chunk_size,
+            ft_begin_index=ft_begin_index,
+            grad_checkpoint=grad_checkpoint,
+            prefix_cache_size=prefix_cache_size,
+            resnet_depth=resnet_depth,
+            feature_grid=feature_grid,
+            student_path=student_path
         )
 
         self.audio_n_segments = audio_n_segments
         self.audio_embed_size = audio_embed_size
+        self.audio_runner = None
+        # 'visual' / 'audio' 时完全跳过另一个分支，av_fc 在缺失的位置看到全 0 特征
+        self.modality = modality
+        # 训练时以 modality_dropout 的概率把某个样本的一路特征置 0 (两路各一半)，让 av_fc 适应单模态输入
+        self.modality_dropout = modality_dropout
 
         a_resnet = torchvision.models.resnet18(pretrained=True)
         a_conv1 = nn.Conv2d(1, 64, kernel_size=(7, 1), stride=(2, 1), padding=(3, 0), bias=False)
-        a_avgpool = nn.AvgPool2d(kernel_size=[8, 2])
+        # 自适应池化：256 x 32 的音频段上与原来的 AvgPool2d([8, 2]) 相同，也支持其他 audio_n_segments
+        a_avgpool = nn.AdaptiveAvgPool2d(1)
         a_modules = [a_conv1] + list(a_resnet.children())[1:-2] + [a_avgpool]
         self.a_resnet = nn.Sequential(*a_modules)
         self.a_fc = nn.Sequential(
@@ -51,74 +76,161 @@ class VAANet(VisualStream):
         # -> n_classes ->[batch_size, n_classes]
         # -> v, a -> 2 -> [batch_size, 2]
 
-    def forward(self, visual: torch.Tensor, audio: torch.Tensor):
-        visual = visual.transpose(0, 1).contiguous()
-        visual.div_(self.NORM_VALUE).sub_(self.MEAN)
+    def _audio_branch(self, audio: torch.Tensor):
+        """MFCC [bs x 4096 x 32] -> fA [bs x 256]"""
+        n_segments, embed_size = self.audio_n_segments, self.audio_embed_size
+        # 切成 n_segments 段: [bs x 4096 x 32] -> [n_segments * bs x 1 x 256 x 32]，只拷贝一次
+        _, timeseries_length, n_mfcc = audio.size()
+        audio = audio.view(-1, n_segments, timeseries_length // n_segments, n_mfcc)
+        audio = audio.transpose(0, 1).flatten(0, 1)
+        audio = self._audio_segment_embeddings(audio)
+        audio = audio.view(n_segments, -1, embed_size)
+        audio = audio.permute(1, 2, 0).contiguous()  # [bs x 256 x 16]
+
+        fA, _ = sequence_attention(audio, self.aa_net)  # [bs x 256]
+        return fA
+
+    def _audio_segment_embeddings(self, segments: torch.Tensor):
+        """音频段 [n x 256 x 32] -> 每段的 embedding [n x 256]"""
+        segments = torch.unsqueeze(segments, dim=1)
+        segments = run_sequential(self.a_resnet, segments, self.grad_checkpoint and self.training)
+        segments = torch.flatten(segments, start_dim=1)
+        return self.a_fc(segments)
+
+    def enable_compile(self):
+        """
+        用 torch.compile 编译 attention heads 和音频分支；冻结的 backbone 保持 eager。
+        编译后的函数挂在实例上，不影响 state_dict。
+        """
+        if not hasattr(torch, 'compile'):
+            raise Exception('--compile needs torch>=2.0')
+        self._visual_heads = torch.compile(self._visual_heads)
+        self._audio_branch = torch.compile(self._audio_branch)
+
+    @torch.no_grad()
+    def forward_early_exit(self, visual: torch.Tensor, audio: torch.Tensor, threshold=0.01, max_remaining_weight=0.2,
+                           min_snippets=3, order='coarse_to_fine'):
+        """
+        逐个 snippet 过 backbone，未处理的 snippet 用时间上最近的已处理 snippet 的特征代替。
+        当某个样本的 VA 预测变化 < threshold，且未处理 snippet 的 temporal 权重 gamma 占比 < max_remaining_weight 时停止。
+        返回 output [bs x 2], gamma [bs x seq_len] 和每个样本实际计算的 snippet 数 [bs]
+        """
+        seq_len, bs = self.seq_len, visual.size(0)
+        fA = self._audio_branch(audio) if self.modality != 'visual' else visual.new_zeros(bs, self.audio_embed_size)
+        snippet_order = early_exit_order(seq_len, order)
+
+        features = None
+        processed = []
+        active = torch.ones(bs, dtype=torch.bool, device=visual.device)
+        n_evaluated = torch.full((bs,), seq_len, dtype=torch.long, device=visual.device)
+        final_output, final_gamma, prev_output = None, None, None
+        for step, s in enumerate(snippet_order):
+            index = active.nonzero().squeeze(1)
+            clip_features = self._clip_features(visual[index, s])
+            if features is None:
+                features = clip_features.new_zeros(seq_len, bs, *clip_features.shape[1:])
+            features[s, index] = clip_features
+            processed.append(s)
+            if step + 1 < min_snippets and step + 1 < seq_len:
+                continue
+
+            nearest = [min(processed, key=lambda p: (abs(p - t), p)) for t in range(seq_len)]
+            F = features[nearest].flatten(0, 1)  # [seq_len * bs x nc x m]
+            fSCT, _, _, gamma = self._visual_heads(F)
+            output = self.av_fc(torch.cat([fSCT, fA], dim=1))
+            if final_output is None:
+                final_output, final_gamma = output.clone(), gamma.clone()
+
+            remaining = [t for t in range(seq_len) if t not in processed]
+            remaining_weight = gamma[:, remaining].sum(dim=1) / gamma.sum(dim=1).clamp(min=1e-6)
+            if step + 1 == seq_len:
+                done = active.clone()
+            elif prev_output is None:
+                done = torch.zeros_like(active)
+            else:
+                stable = (output - prev_output).abs().max(dim=1)[0] < threshold
+                done = active & stable & (remaining_weight < max_remaining_weight)
+            final_output[active] = output[active]
+            final_gamma[active] = gamma[active]
+            n_evaluated[done] = step + 1
+            active &= ~done
+            prev_output = output
+            if not active.any():
+                break
+        return final_output, final_gamma, n_evaluated
+
+    def _missing_visual(self, bs, like: torch.Tensor):
+        """audio-only: 视觉特征为 0，attention 也用 0 占位，保持输出格式不变"""
+        seq_len, k, m = self.seq_len, self.hp['k'], self.hp['m']
+        fSCT = like.new_zeros(bs, k)
+        alpha = like.new_zeros(seq_len, bs, m)
+        beta = like.new_zeros(seq_len, bs, k)
+        gamma = like.new_zeros(bs, seq_len)
+        return fSCT, alpha, beta, gamma
+
+    def enable_concurrent_branches(self, audio_threads):
+        """音频分支在单独的线程里和视觉分支并行执行，audio_threads 是它的 intra-op 线程数"""
+        self.audio_runner = BranchRunner(audio_threads)
+
+    def forward(self, visual: torch.Tensor, audio: torch.Tensor, keys=None, prefix=None):
+        use_visual, use_audio = self.modality != 'audio', self.modality != 'visual'
+        bs = visual.size(0) if use_visual else audio.size(0)
+        # TTA 输入 [bs, n_views, seq_len, 3, duration, H, W]：所有视角作为一个 batch 过视觉分支，
+        # 音频分支每个视频只算一次，输出在视角间取平均
+        multi_view = use_visual and visual.dim() == 7
+        if multi_view:
+            n_views = visual.size(1)
+            visual = visual.flatten(0, 1)
+            keys = None
+
+        # 两个分支在 torch.cat([fSCT, fA]) 之前互不依赖
+        concurrent = self.audio_runner is not None and use_visual and use_audio
+        if concurrent:
+            future_fA = self.audio_runner.submit(self._audio_branch, audio)
 
         # Visual branch
-        seq_len, batch, nc, snippet_duration, sample_size, _ = visual.size()
-        visual = visual.view(seq_len * batch, nc, snippet_duration, sample_size, sample_size).contiguous()
-        with torch.no_grad():
-            F = self.resnet(visual)
-            F = torch.squeeze(F, dim=2)
-            F = torch.flatten(F, start_dim=2)
-        F = self.conv0(F)  # [B x 512 x 16]
-
-        Hs = self.sa_net['conv'](F)
-        Hs = torch.squeeze(Hs, dim=1)
-        Hs = self.sa_net['fc'](Hs)
-        As = self.sa_net['softmax'](Hs)
-        As = torch.mul(As, self.hp['m'])
-        alpha = As.view(seq_len, batch, self.hp['m'])
-
-        fS = torch.mul(F, torch.unsqueeze(As, dim=1).repeat(1, self.hp['k'], 1))
-
-        G = fS.transpose(1, 2).contiguous()
-        Hc = self.cwa_net['conv'](G)
-        Hc = torch.squeeze(Hc, dim=1)
-        Hc = self.cwa_net['fc'](Hc)
-        Ac = self.cwa_net['softmax'](Hc)
-        Ac = torch.mul(Ac, self.hp['k'])
-        beta = Ac.view(seq_len, batch, self.hp['k'])
-
-        fSC = torch.mul(fS, torch.unsqueeze(Ac, dim=2).repeat(1, 1, self.hp['m']))
-        fSC = torch.mean(fSC, dim=2)
-        fSC = fSC.view(seq_len, batch, self.hp['k']).contiguous()
-        fSC = fSC.permute(1, 2, 0).contiguous()
-
-        Ht = self.ta_net['conv'](fSC)
-        Ht = torch.squeeze(Ht, dim=1)
-        Ht = self.ta_net['fc'](Ht)
-        At = self.ta_net['relu'](Ht)
-        gamma = At.view(batch, seq_len)
-
-        fSCT = torch.mul(fSC, torch.unsqueeze(At, dim=1).repeat(1, self.hp['k'], 1))
-        fSCT = torch.mean(fSCT, dim=2)  # [bs x 512]
+        if use_visual:
+            F = self._encode(visual, keys, prefix)
+            fSCT, alpha, beta, gamma = self._visual_heads(F)  # fSCT: [bs x 512]
+        else:
+            fSCT, alpha, beta, gamma = self._missing_visual(bs, audio)
 
         # Audio branch
-        bs = audio.size(0)
-        audio = audio.transpose(0, 1).contiguous()
-        audio = audio.chunk(self.audio_n_segments, dim=0)
-        audio = torch.stack(audio, dim=0).contiguous()
-        audio = audio.transpose(1, 2).contiguous()  # [16 x bs x 256 x 32]
-        audio = torch.flatten(audio, start_dim=0, end_dim=1)  # [B x 256 x 32]
-        audio = torch.unsqueeze(audio, dim=1)
-        audio = self.a_resnet(audio)
-        audio = torch.flatten(audio, start_dim=1).contiguous()
-        audio = self.a_fc(audio)
-        audio = audio.view(self.audio_n_segments, bs, self.audio_embed_size).contiguous()
-        audio = audio.permute(1, 2, 0).contiguous()
-
-        Ha = self.aa_net['conv'](audio)
-        Ha = torch.squeeze(Ha, dim=1)
-        Ha = self.aa_net['fc'](Ha)
-        Aa = self.aa_net['relu'](Ha)
-
-        fA = torch.mul(audio, torch.unsqueeze(Aa, dim=1).repeat(1, self.audio_embed_size, 1))
-        fA = torch.mean(fA, dim=2)  # [bs x 256]
+        if concurrent:
+            fA = future_fA.result()
+        elif use_audio:
+            fA = self._audio_branch(audio)
+        else:
+            fA = fSCT.new_zeros(bs, self.audio_embed_size)
+        if multi_view:
+            fA = fA.repeat_interleave(n_views, dim=0)
+
+        if self.training and self.modality_dropout > 0 and use_visual and use_audio:
+            r = torch.rand(fSCT.size(0), 1, device=fSCT.device)
+            fSCT = fSCT * (r >= self.modality_dropout / 2).to(fSCT.dtype)
+            fA = fA * ((r < self.modality_dropout / 2) | (r >= self.modality_dropout)).to(fA.dtype)
 
         # Fusion
         fSCTA = torch.cat([fSCT, fA], dim=1)
         output = self.av_fc(fSCTA)
 
+        if multi_view:
+            output = output.view(bs, n_views, -1).mean(dim=1)
+            alpha = alpha.view(self.seq_len, bs, n_views, -1).mean(dim=2)
+            beta = beta.view(self.seq_len, bs, n_views, -1).mean(dim=2)
+            gamma = gamma.view(bs, n_views, -1).mean(dim=1)
         return output, alpha, beta, gamma
+
+
+def early_exit_order(seq_len, order='coarse_to_fine'):
+    """snippet 的处理顺序；coarse_to_fine: 0, 6, 3, 9, 1, 2, ... (seq_len=12)"""
+    if order == 'sequential':
+        return list(range(seq_len))
+    snippet_order = []
+    step = seq_len
+    while step >= 1:
+        for s in range(0, seq_len, step):
+            if s not in snippet_order:
+                snippet_order.append(s)
+        step //= 2
+    return snippet_order
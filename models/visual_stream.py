@@ -1,7 +1,11 @@
 import torch
 import torch.nn as nn
 import torchvision
-from models.resnet import pretrained_resnet101
+from models.resnet import pretrained_resnet, resnet_out_channels, resnet_feature_size, kinetics_checkpoint_path
+from models.frozen_backbone import FrozenBackbone, FeatureCache
+from models.student import load_student
+from models.checkpointing import run_sequential
+from models.attention import spatial_channel_attention, sequence_attention
 
 
 class VisualStream(nn.Module):
@@ -10,14 +14,27 @@ class VisualStream(nn.Module):
                  sample_size,
                  n_classes,
                  seq_len,
-                 pretrained_resnet101_path):
+                 pretrained_resnet101_path,
+                 backbone_chunk_size=0,
+                 ft_begin_index=5,
+                 grad_checkpoint=False,
+                 prefix_cache_size=0,
+                 resnet_depth=101,
+                 feature_grid=0,
+                 student_path=''):
         super(VisualStream, self).__init__()
         self.snippet_duration = snippet_duration
         self.sample_size = sample_size
         self.n_classes = n_classes
         self.seq_len = seq_len
-        self.ft_begin_index = 5
+        self.ft_begin_index = ft_begin_index  # layer{ft_begin_index} 及之后参与训练，5: 全部冻结
+        self.grad_checkpoint = grad_checkpoint
+        self.prefix_cache = FeatureCache(prefix_cache_size) if prefix_cache_size > 0 else None
         self.pretrained_resnet101_path = pretrained_resnet101_path
+        self.resnet_depth = resnet_depth
+        self.feature_grid = feature_grid  # >0: backbone 输出自适应池化到 grid x grid，m 与输入分辨率无关
+        self.backbone_chunk_size = backbone_chunk_size  # 0: 所有 clip 一次过 backbone
+        self.student_path = student_path  # 非空时用蒸馏得到的 StudentBackbone 代替 3D ResNet
 
         self._init_norm_val()
         self._init_hyperparameters()
@@ -30,23 +47,51 @@ class VisualStream(nn.Module):
         self.MEAN = 100.0 / self.NORM_VALUE
 
     def _init_encoder(self):
-        resnet, _ = pretrained_resnet101(snippet_duration=self.snippet_duration,
-                                         sample_size=self.sample_size,
-                                         n_classes=self.n_classes,
-                                         ft_begin_index=self.ft_begin_index,
-                                         pretrained_resnet101_path=self.pretrained_resnet101_path)
-
-        children = list(resnet.children())
-        self.resnet = nn.Sequential(*children[:-2])  # delete the last fc and the avgpool layer
-        for param in self.resnet.parameters():
-            param.requires_grad = False
+        if self.student_path != '':
+            self._init_student_encoder()
+            return
+        resnet, _ = pretrained_resnet(self.resnet_depth,
+                                      snippet_duration=self.snippet_duration,
+                                      sample_size=self.sample_size,
+                                      n_classes=self.n_classes,
+                                      ft_begin_index=self.ft_begin_index,
+                                      pretrained_path=kinetics_checkpoint_path(self.pretrained_resnet101_path,
+                                                                               self.resnet_depth))
+
+        # delete the last fc and the avgpool layer
+        # children: conv1, bn1, relu, maxpool, layer1, ..., layer4
+        children = list(resnet.children())[:-2]
+        n_frozen = 3 + self.ft_begin_index
+        # 冻结的前缀：BN 折叠进 conv，始终 eval + inference_mode
+        self.resnet = FrozenBackbone(nn.Sequential(*children[:n_frozen]))
+        # 参与 fine-tuning 的 layer3/layer4，可选 activation checkpointing
+        self.resnet_ft = nn.Sequential(*children[n_frozen:])
+
+    def _init_student_encoder(self):
+        student = load_student(self.student_path)
+        feature_size = resnet_feature_size(self.snippet_duration, self.sample_size)
+        if student.nc != self.hp['nc'] or student.feature_size != tuple(feature_size):
+            raise Exception('Student {} was distilled for nc={}, feature size {}, but the model expects nc={}, {}'.format(
+                self.student_path, student.nc, student.feature_size, self.hp['nc'], tuple(feature_size)))
+        # student 整体冻结，替代 3D ResNet 的全部 stage
+        self.resnet = FrozenBackbone(student)
+        self.resnet_ft = nn.Sequential()
 
     def _init_hyperparameters(self):
+        # nc 是 backbone 输出通道数 (ResNet-18/34: 512, ResNet-50/101: 2048)，k 不超过 nc
+        # m 由 backbone 的实际输出 T' x H' x W' 决定 (112px/16 帧时为 1 x 4 x 4)
+        nc = resnet_out_channels(self.resnet_depth)
+        if self.feature_grid > 0:
+            t, h, w = 1, self.feature_grid, self.feature_grid
+            self.feature_pool = nn.AdaptiveAvgPool3d((t, h, w))
+        else:
+            t, h, w = resnet_feature_size(self.snippet_duration, self.sample_size)
+            self.feature_pool = None
         self.hp = {
-            'nc': 2048,
-            'k': 512,
-            'm': 16,
-            'hw': 4
+            'nc': nc,
+            'k': min(512, nc),
+            'm': t * h * w,
+            'hw': h
         }
 
     def _init_attention_subnets(self):
@@ -102,48 +147,98 @@ class VisualStream(nn.Module):
         elif isinstance(m, nn.Conv1d):
             nn.init.kaiming_normal_(m.weight, mode='fan_out')
 
-    def forward(self, input: torch.Tensor):
-        input = input.transpose(0, 1).contiguous()  # input.shape=[seq_len, batch, 3, 16, 112, 112]
-        input.div_(self.NORM_VALUE).sub_(self.MEAN)
-
-        seq_len, batch, nc, snippet_duration, sample_size, _ = input.size()
-        input = input.view(seq_len * batch, nc, snippet_duration, sample_size, sample_size)
-        with torch.no_grad():
-            output = self.resnet(input)
-            output = torch.squeeze(output, dim=2)
-            output = torch.flatten(output, start_dim=2)
-        F = self.conv0(output)  # [B x 512 x 16]
-
-        Hs = self.sa_net['conv'](F)
-        Hs = torch.squeeze(Hs, dim=1)
-        Hs = self.sa_net['fc'](Hs)
-        As = self.sa_net['softmax'](Hs)
-        As = torch.mul(As, self.hp['m'])
-        alpha = As.view(seq_len, batch, self.hp['m'])
-
-        fS = torch.mul(F, torch.unsqueeze(As, dim=1).repeat(1, self.hp['k'], 1))
-
-        G = fS.transpose(1, 2).contiguous()
-        Hc = self.cwa_net['conv'](G)
-        Hc = torch.squeeze(Hc, dim=1)
-        Hc = self.cwa_net['fc'](Hc)
-        Ac = self.cwa_net['softmax'](Hc)
-        Ac = torch.mul(Ac, self.hp['k'])
-        beta = Ac.view(seq_len, batch, self.hp['k'])
-
-        fSC = torch.mul(fS, torch.unsqueeze(Ac, dim=2).repeat(1, 1, self.hp['m']))
-        fSC = torch.mean(fSC, dim=2)
-        fSC = fSC.view(seq_len, batch, self.hp['k']).contiguous()
-        fSC = fSC.permute(1, 2, 0).contiguous()
-
-        Ht = self.ta_net['conv'](fSC)
-        Ht = torch.squeeze(Ht, dim=1)
-        Ht = self.ta_net['fc'](Ht)
-        At = self.ta_net['relu'](Ht)
-        gamma = At.view(batch, seq_len)
-
-        fSCT = torch.mul(fSC, torch.unsqueeze(At, dim=1).repeat(1, self.hp['k'], 1))
-        fSCT = torch.mean(fSCT, dim=2)
-
+    def _encode(self, visual: torch.Tensor, keys=None, prefix=None):
+        """
+        [batch, seq_len, 3, duration, H, W] -> backbone features [seq_len * batch, nc, m]
+        prefix: 已经算好的冻结前缀输出 (例如 ensemble 里各成员共享的)，给出时不再跑冻结的 backbone
+        """
+        if prefix is not None:
+            F = prefix
+        elif self.prefix_cache is not None and keys is not None:
+            F = self._cached_frozen_features(visual, keys)
+        else:
+            F = self._frozen_features(visual)
+        return self._finish_features(F)
+
+    def shared_prefix(self, visual: torch.Tensor, keys=None):
+        """
+        冻结前缀的输出，供共享这个 backbone 的多个模型 (ensemble 成员、多 head 训练) 作为 prefix 使用
+        visual: [batch, seq_len, ...] 或 TTA 的 [batch, n_views, seq_len, ...]
+        """
+        # 和 VAANet.forward 一样，TTA 的多视角输入先把视角并进 batch
+        clips = visual.flatten(0, 1) if visual.dim() == 7 else visual
+        if self.prefix_cache is not None and keys is not None and visual.dim() == 6:
+            return self._cached_frozen_features(clips, keys)
+        return self._frozen_features(clips)
+
+    def _finish_features(self, F: torch.Tensor):
+        """frozen prefix output -> fine-tuned stages -> [B x nc x m]"""
+        F = run_sequential(self.resnet_ft, F, self.grad_checkpoint and self.training)
+        if self.feature_pool is not None:
+            F = self.feature_pool(F)
+        F = torch.flatten(F, start_dim=2)  # [B x nc x T' * H' * W']
+        return F
+
+    def _clip_features(self, clips: torch.Tensor):
+        """单独编码一批 clip: [n_clips, 3, duration, H, W] -> [n_clips, nc, m]"""
+        return self._finish_features(self._encode_clips(clips))
+
+    def _frozen_features(self, visual: torch.Tensor):
+        """[batch, seq_len, 3, duration, H, W] -> frozen prefix output [seq_len * batch, C, T, H', W']"""
+        clips = visual.transpose(0, 1).flatten(0, 1)
+        if self.backbone_chunk_size <= 0:
+            return self._encode_clips(clips)
+        # 分块过 backbone，峰值激活内存只和 chunk 大小有关，与 batch * seq_len 无关
+        return torch.cat([self._encode_clips(chunk) for chunk in clips.split(self.backbone_chunk_size)], dim=0)
+
+    def _cached_frozen_features(self, visual: torch.Tensor, keys):
+        """同 _frozen_features，但前缀输出按 key 缓存；key 为空的样本 (增强不可复现) 每次重算"""
+        cached = [self.prefix_cache.get(key) if key else None for key in keys]
+        missing = [b for b, feature in enumerate(cached) if feature is None]
+        features = [None] * len(keys)
+        if len(missing) > 0:
+            index = torch.tensor(missing, device=visual.device)
+            computed = self._frozen_features(visual.index_select(0, index))
+            computed = computed.view(self.seq_len, len(missing), *computed.shape[1:]).transpose(0, 1)
+            for j, b in enumerate(missing):
+                features[b] = computed[j]
+                if keys[b]:
+                    self.prefix_cache.put(keys[b], computed[j])
+            dtype = computed.dtype
+        else:
+            dtype = self.resnet.output_dtype(visual.dtype)
+        for b, feature in enumerate(cached):
+            if feature is not None:
+                features[b] = feature.to(visual.device, dtype)
+        return torch.stack(features, dim=1).flatten(0, 1)  # [seq_len * batch, ...]
+
+    def _encode_clips(self, clips: torch.Tensor):
+        """[n_clips, 3, duration, H, W] -> frozen prefix output [n_clips, C, T, H', W']"""
+        return self.resnet(self._normalize(clips))
+
+    def _normalize(self, clips: torch.Tensor):
+        # 不对输入做 in-place 归一化：会改掉调用者的张量，也会让 torch.compile 断图
+        return clips.div(self.NORM_VALUE).sub_(self.MEAN)
+
+    def _visual_heads(self, F: torch.Tensor):
+        """backbone features [seq_len * batch, nc, m] -> fSCT [batch x k], alpha, beta, gamma"""
+        # reshape 只依赖 seq_len/k/m 这些常量，batch 用 -1，避免 torch.compile 因 batch 变化而重编译
+        seq_len, k, m = self.seq_len, self.hp['k'], self.hp['m']
+        F = self.conv0(F)  # [B x 512 x 16]
+
+        fSC, As, Ac = spatial_channel_attention(F, self.sa_net, self.cwa_net)
+        alpha = As.view(seq_len, -1, m)
+        beta = Ac.view(seq_len, -1, k)
+
+        fSC = fSC.view(seq_len, -1, k)
+        fSC = fSC.permute(1, 2, 0).contiguous()  # [bs x 512 x seq_len]
+
+        fSCT, At = sequence_attention(fSC, self.ta_net)  # [bs x 512]
+        gamma = At  # [batch x seq_len]
+        return fSCT, alpha, beta, gamma
+
+    def forward(self, input: torch.Tensor, keys=None):
+        F = self._encode(input, keys)  # input.shape=[batch, seq_len, 3, 16, 112, 112]
+        fSCT, alpha, beta, gamma = self._visual_heads(F)
         output = self.fc(fSCT)
         return output, alpha, beta, gamma
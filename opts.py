@@ -1,7 +1,7 @@
 import argparse
 
 
-def parse_opts():
+def parse_opts(args=None):
     parser = argparse.ArgumentParser()
     arguments = {
         'coefficients': [
@@ -37,18 +37,44 @@ def parse_opts():
                  default='/data/jjr/results',
                  type=str,
                  help="Local path of result directory"),
+            dict(name='--checkpoint',
+                 type=str,
+                 default='',
+                 help='Global path of a checkpoint saved by val_epoch (save_*.pth)'),
+            dict(name='--ensemble_checkpoints',
+                 type=str,
+                 nargs='*',
+                 default=[],
+                 help='Checkpoints averaged at inference over one shared frozen-backbone pass (replaces --checkpoint)'),
             dict(name='--expr_name',
                  type=str,
           # main.py 会把日志和 checkpoint 写到 opt.result_path/opt.expr_name/ 下
           # local2global_path 会给你补全 opt.log_path、opt.ckpt_path 等变量
           # 所以只要给 --expr_name 起个不会重复的名字即可 。
                  default=''),
+            dict(name='--overwrite',
+                 action='store_true',
+                 default=False,
+                 help='Delete an existing <result_path>/<expr_name> instead of adding a _N suffix'),
             dict(name='--audio_path',
                  type=str,
                #   default='VideoEmotion8--mp3',
                #   default='/data/jjr/VideoEmotion8--mp3',
                  default="/data/jjr/zju-visual-auditory-dataset--mp3",
-                 help='Local path of audios')
+                 help='Local path of audios'),
+            dict(name='--snippet_cache_path',
+                 type=str,
+                 default='',
+                 help='Global path of the uint8 snippet cache for deterministic transforms (empty: disabled)'),
+            dict(name='--student_path',
+                 type=str,
+                 default='',
+                 help='Global path of a student backbone saved by tools.distill_student; replaces the 3D ResNet (empty: disabled)'),
+            dict(name='--head_configs',
+                 type=str,
+                 default='',
+                 help='JSON list of head configurations trained together on one data stream and backbone pass, '
+                      'each overriding some of core.multi_head.HEAD_OPTS (empty: train a single model)'),
 
         ],
         'core': [
@@ -69,7 +95,9 @@ def parse_opts():
                  help='Number of classes'),
             dict(name='--seq_len',
                  default=12,
-                 type=int),
+                 type=int,
+                 help='Snippets per video. The temporal attention ta_net has a Linear(seq_len, seq_len), so a '
+                      'checkpoint only loads (and is only valid) at the seq_len it was trained with'),
             dict(name='--loss_func',
                #   default='pcce_ve8',
                  default="va_mse",
@@ -83,6 +111,18 @@ def parse_opts():
                  default=0.0,
                  type=float,
                  help='Weight Decay'),
+            dict(name='--aug_seed',
+                 default=-1,
+                 type=int,
+                 help='Seed of the counter-based augmentation RNG keyed on (seed, epoch, video id); -1 uses global random'),
+            dict(name='--n_aug_views',
+                 default=0,
+                 type=int,
+                 help='Number of distinct augmented views per video, reused cyclically over epochs (0: one per epoch)'),
+            dict(name='--accumulation_steps',
+                 default=1,
+                 type=int,
+                 help='Number of batches whose gradients are accumulated before each optimizer step'),
             dict(name='--fps',
                #   default=30,
                  default=24,
@@ -100,6 +140,57 @@ def parse_opts():
                 'name': '--audio_n_segments',
                 'default': 16,
                 'type': int,
+            },
+            {
+                'name': '--resnet_depth',
+                'default': 101,
+                'type': int,
+                'choices': [18, 34, 50, 101],
+                'help': 'Depth of the 3D ResNet; resnet-{depth}-kinetics.pth is loaded from the directory of --resnet101_pretrained',
+            },
+            {
+                'name': '--feature_grid',
+                'default': 0,
+                'type': int,
+                'help': 'Adaptively pool backbone features to 1 x grid x grid so the heads do not depend on '
+                        'sample_size/snippet_duration (0: use the backbone output as is)',
+            },
+            {
+                'name': '--modality',
+                'default': 'av',
+                'type': str,
+                'choices': ['av', 'visual', 'audio'],
+                'help': 'Branches to run; visual-only / audio-only skip decoding and computing the other branch',
+            },
+            {
+                'name': '--modality_dropout',
+                'default': 0.0,
+                'type': float,
+                'help': 'Training only: probability of zeroing one modality of a sample (split evenly between the two)',
+            },
+            {
+                'name': '--backbone_chunk_size',
+                'default': 0,
+                'type': int,
+                'help': 'Clips per 3D ResNet pass (0: all batch_size * seq_len clips at once)',
+            },
+            {
+                'name': '--ft_begin_index',
+                'default': 5,
+                'type': int,
+                'help': 'Fine-tune the 3D ResNet from layer{ft_begin_index} on (5: frozen, 4: layer4, 3: layer3 + layer4)',
+            },
+            {
+                'name': '--grad_checkpoint',
+                'action': 'store_true',
+                'default': False,
+                'help': 'Activation checkpointing on the fine-tuned ResNet stages and the audio ResNet-18',
+            },
+            {
+                'name': '--prefix_cache_size',
+                'default': 0,
+                'type': int,
+                'help': 'Videos whose frozen-prefix outputs are cached in memory (0: disabled); needs reproducible inputs',
             }
         ],
 
@@ -109,14 +200,69 @@ def parse_opts():
                #   default='ve8',
                  default='zju_va',
                  ),
+            dict(name='--n_folds',
+                 default=0,
+                 type=int,
+                 help='zju_va: k-fold split with --fold as validation (0: the fixed 80/20 split)'),
+            dict(name='--fold',
+                 default=0,
+                 type=int,
+                 help='zju_va: validation fold when --n_folds > 1'),
+            dict(name='--device',
+                 type=str,
+                 default='cuda',
+                 choices=['cuda', 'cpu'],
+                 help='Device for training, validation and inference'),
+            dict(name='--intra_op_threads',
+                 default=0,
+                 type=int,
+                 help='CPU only: threads used inside one op (0: torch default, usually the number of physical cores)'),
+            dict(name='--inter_op_threads',
+                 default=0,
+                 type=int,
+                 help='CPU only: threads used to run independent ops concurrently (0: torch default)'),
+            dict(name='--audio_threads',
+                 default=0,
+                 type=int,
+                 help='CPU only: run the audio branch concurrently with the visual branch on a worker thread with this '
+                      'many OpenMP threads, taken from the visual budget (0: run the branches one after another)'),
+            dict(name='--amp',
+                 type=str,
+                 default='none',
+                 choices=['none', 'bf16', 'fp16'],
+                 help='Autocast dtype; the frozen backbone is stored in this dtype, attention softmax and loss stay in fp32'),
+            dict(name='--compile',
+                 action='store_true',
+                 default=False,
+                 help='torch.compile the attention heads and the audio branch (torch>=2.0)'),
+            dict(name='--early_exit_threshold',
+                 default=0.0,
+                 type=float,
+                 help='Inference only: stop adding snippets once the VA prediction changes less than this (0: disabled)'),
+            dict(name='--early_exit_max_weight',
+                 default=0.2,
+                 type=float,
+                 help='Inference only: early exit also needs the unprocessed snippets to hold less than this share of gamma'),
+            dict(name='--early_exit_min_snippets',
+                 default=3,
+                 type=int,
+                 help='Inference only: snippets always evaluated before an early exit'),
+            dict(name='--tta_views',
+                 default=0,
+                 type=int,
+                 help='Validation/test: average over N deterministic temporal x spatial views decoded once (0: off)'),
             dict(name='--use_cuda',
                  action='store_true',
                  default=False,
-                 help='only cuda supported!'
+                 help='deprecated, use --device'
                  ),
             dict(name='--debug',
                  default=False,
                  action='store_true'),
+            dict(name='--deterministic_val',
+                 action='store_true',
+                 default=False,
+                 help='validate with center crops and TSN(center=True), which makes validation snippets cacheable'),
             dict(name='--dl',
                  action='store_true',
                  default=False,
@@ -142,5 +288,5 @@ def parse_opts():
             del argument['name']
             parser.add_argument(name, **argument)
 
-    args = parser.parse_args()
+    args = parser.parse_args(args)
     return args
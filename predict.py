@@ -0,0 +1,139 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+import torch
+from torch.utils.data import DataLoader
+
+from opts import parse_opts
+from core.model import load_inference_model
+from core.utils import setup_device, get_spatial_transform, infer
+from datasets.raw_video import RawVideoDataset, list_videos, collate_videos
+from transforms.temporal import TSN
+
+CSV_FIELDS = ['video', 'video_id', 'valence', 'arousal', 'gamma', 'error']
+
+
+class PredictionWriter(object):
+    """
+    Appends one record per video to a .jsonl or .csv file and flushes after every batch.
+    Videos already in the file (scored or failed) are skipped when the run is resumed;
+    a line cut off by an interrupted run is dropped first.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.is_csv = path.endswith('.csv')
+        self.done = set()
+        exists = os.path.exists(path)
+        if exists:
+            self._drop_partial_line()
+            self.done = set(record['video'] for record in self._read())
+        self.file = open(path, 'a', newline='')
+        if self.is_csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=CSV_FIELDS)
+            if not exists or os.path.getsize(path) == 0:
+                self.writer.writeheader()
+
+    def _drop_partial_line(self):
+        with open(self.path, 'rb+') as f:
+            content = f.read()
+            if len(content) > 0 and not content.endswith(b'\n'):
+                f.truncate(content.rfind(b'\n') + 1)
+
+    def _read(self):
+        with open(self.path, 'r', newline='') as f:
+            if self.is_csv:
+                return list(csv.DictReader(f))
+            return [json.loads(line) for line in f if line.strip()]
+
+    def write(self, record):
+        if self.is_csv:
+            record = dict(record)
+            if 'gamma' in record:
+                record['gamma'] = ' '.join('{:.4f}'.format(g) for g in record['gamma'])
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + '\n')
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def video_record(path, error=''):
+    record = {'video': path, 'video_id': os.path.splitext(os.path.basename(path))[0]}
+    if error != '':
+        record['error'] = error
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--inputs', required=True, nargs='+', type=str, help='Video files and/or directories')
+    parser.add_argument('--output', required=True, type=str, help='.jsonl or .csv; appended to and resumed from')
+    parser.add_argument('--with_attention', action='store_true', help='Also write the temporal attention gamma')
+    parser.add_argument('--report_every', default=10, type=int, help='Print throughput every N batches')
+    args, argv = parser.parse_known_args()
+    opt = parse_opts(argv)
+    setup_device(opt)
+
+    writer = PredictionWriter(args.output)
+    paths = [path for path in list_videos(args.inputs) if path not in writer.done]
+    print('{} videos to score ({} already in {})'.format(len(paths), len(writer.done), args.output))
+    if len(paths) == 0:
+        writer.close()
+        return
+
+    model = load_inference_model(opt)
+
+    spatial_transform = get_spatial_transform(opt, 'val')
+    temporal_transform = TSN(seq_len=opt.seq_len, snippet_duration=opt.snippet_duration, center=True)
+    dataset = RawVideoDataset(paths, spatial_transform, temporal_transform,
+                              need_audio=opt.modality != 'visual', need_visual=opt.modality != 'audio',
+                              n_tta_views=opt.tta_views)
+    # worker 并行解码，一个 batch 里是不同视频的样本
+    loader = DataLoader(dataset, batch_size=opt.batch_size, shuffle=False, num_workers=opt.n_threads,
+                        collate_fn=collate_videos, pin_memory=opt.device.type == 'cuda')
+
+    begin = time.time()
+    n_done, n_failed = 0, 0
+    with torch.no_grad():
+        for i, (visual, audio, batch_paths, failed) in enumerate(loader):
+            for path, error in failed:
+                writer.write(video_record(path, error))
+            if visual is not None:
+                visual = visual.to(opt.device, non_blocking=True).float()
+                audio = audio.to(opt.device, non_blocking=True)
+                output, gamma = infer(opt, model, visual, audio)
+                output, gamma = output.cpu(), gamma.cpu()
+                for j, path in enumerate(batch_paths):
+                    record = video_record(path)
+                    record['valence'] = round(output[j, 0].item(), 6)
+                    record['arousal'] = round(output[j, 1].item(), 6)
+                    if args.with_attention:
+                        record['gamma'] = [round(g, 6) for g in gamma[j].tolist()]
+                    writer.write(record)
+            writer.flush()
+            n_done += len(batch_paths) + len(failed)
+            n_failed += len(failed)
+            if (i + 1) % args.report_every == 0:
+                print('[{}/{}] {:.2f} videos/s'.format(n_done, len(paths), n_done / (time.time() - begin)))
+    writer.close()
+
+    elapsed = time.time() - begin
+    print('Scored {} videos ({} failed) in {:.1f}s: {:.2f} videos/s'.format(
+        n_done, n_failed, elapsed, n_done / elapsed))
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python predict.py --checkpoint /data/jjr/results/demo/checkpoints/save_25.pth --inputs /data/new_videos --output va.jsonl
+"""
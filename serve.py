@@ -0,0 +1,163 @@
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import torch
+
+from opts import parse_opts
+from core.model import load_inference_model
+from core.utils import setup_device, get_spatial_transform, infer
+from core.serving import DynamicBatcher, LatencyStats
+from datasets.raw_video import RawVideoDataset
+from transforms.temporal import TSN
+
+# 解码进程里的 RawVideoDataset，由 _init_decoder 创建
+_decoder = None
+
+
+def _init_decoder(opt):
+    global _decoder
+    # 每个解码进程只用一个线程，否则 n_threads 个进程各自开满核数的线程互相抢占
+    torch.set_num_threads(1)
+    spatial_transform = get_spatial_transform(opt, 'val')
+    temporal_transform = TSN(seq_len=opt.seq_len, snippet_duration=opt.snippet_duration, center=True)
+    _decoder = RawVideoDataset([], spatial_transform, temporal_transform,
+                               need_audio=opt.modality != 'visual', need_visual=opt.modality != 'audio',
+                               n_tta_views=opt.tta_views)
+
+
+def _decode(path):
+    return _decoder.load(path)
+
+
+class InferenceServer(object):
+    """
+    Decodes videos in a process pool, batches the decoded samples with a DynamicBatcher and
+    scores every batch with one model call.
+    """
+
+    def __init__(self, opt, model, max_batch_size, max_delay):
+        self.opt = opt
+        self.model = model
+        # spawn：主进程已经起了 torch / CUDA 和 HTTP 线程，fork 出来的子进程可能死锁
+        self.decoders = ProcessPoolExecutor(max_workers=max(1, opt.n_threads), initializer=_init_decoder,
+                                            initargs=(opt,), mp_context=multiprocessing.get_context('spawn'))
+        self.batcher = DynamicBatcher(self._score, max_batch_size, max_delay)
+        self.latency = LatencyStats()
+        self.n_decoding = 0
+        self.lock = threading.Lock()
+
+    def _score(self, items):
+        visual = torch.stack([item[0] for item in items]).to(self.opt.device).float()
+        audio = torch.stack([item[1] for item in items]).to(self.opt.device)
+        with torch.no_grad():
+            output, gamma = infer(self.opt, self.model, visual, audio)
+        output, gamma = output.cpu(), gamma.cpu()
+        return [{'valence': output[i, 0].item(), 'arousal': output[i, 1].item(), 'gamma': gamma[i].tolist()}
+                for i in range(len(items))]
+
+    def predict(self, path):
+        begin = time.time()
+        with self.lock:
+            self.n_decoding += 1
+        try:
+            sample = self.decoders.submit(_decode, path).result()
+        finally:
+            with self.lock:
+                self.n_decoding -= 1
+        result = self.batcher.submit(sample).result()
+        self.latency.add(time.time() - begin)
+        return result
+
+    def metrics(self):
+        metrics = {'decoding': self.n_decoding}
+        metrics.update(self.batcher.summary())
+        metrics.update({'request_' + k: v for k, v in self.latency.summary().items()})
+        return metrics
+
+
+def make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, code, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._send_json(200, server.metrics())
+            elif self.path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            else:
+                self._send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._send_json(404, {'error': 'not found'})
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            upload = None
+            try:
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    # {"path": "/path/to/video.mp4"}，服务器本地的文件
+                    path = json.loads(body.decode('utf-8'))['path']
+                else:
+                    # 上传的视频字节，存成临时文件交给 ffmpeg
+                    suffix = os.path.splitext(self.headers.get('X-Filename', 'upload.mp4'))[1]
+                    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+                        f.write(body)
+                        upload = path = f.name
+                self._send_json(200, server.predict(path))
+            except Exception as e:
+                self._send_json(500, {'error': '{}: {}'.format(type(e).__name__, e)})
+            finally:
+                if upload is not None:
+                    os.remove(upload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1', type=str)
+    parser.add_argument('--port', default=8080, type=int)
+    parser.add_argument('--max_batch_size', default=8, type=int, help='Largest batch of requests per model call')
+    parser.add_argument('--max_batch_delay_ms', default=20.0, type=float,
+                        help='Longest a decoded request waits for others to join its batch')
+    args, argv = parser.parse_known_args()
+    opt = parse_opts(argv)
+    setup_device(opt)
+    model = load_inference_model(opt)
+
+    server = InferenceServer(opt, model, args.max_batch_size, args.max_batch_delay_ms / 1000)
+    httpd = ThreadingHTTPServer((args.host, args.port), make_handler(server))
+    print('Serving on http://{}:{} (POST /predict, GET /metrics)'.format(args.host, args.port))
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    httpd.server_close()
+    server.decoders.shutdown()
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python serve.py --checkpoint /data/jjr/results/demo/checkpoints/save_25.pth --device cpu --n_threads 4
+curl -X POST localhost:8080/predict -H 'Content-Type: application/json' -d '{"path": "/data/videos/a.mp4"}'
+curl -X POST localhost:8080/predict -H 'X-Filename: a.mp4' --data-binary @a.mp4
+curl localhost:8080/metrics
+"""
@@ -0,0 +1,181 @@
+import argparse
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import time
+
+from opts import parse_opts
+from core.sweep import load_search_space, config_args, rung_epochs, SuccessiveHalving
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class Trial(object):
+    """One (configuration, fold) run of main.py in a subprocess"""
+
+    def __init__(self, config_id, config, fold, expr_name, result_path, argv):
+        self.config_id = config_id
+        self.config = config
+        self.fold = fold
+        self.expr_name = expr_name
+        self.result_path = result_path
+        self.argv = argv
+        self.history = []
+        self.status = 'pending'
+        self.process = None
+        self.slot = None
+        self.started = 0.0
+
+    def read_metrics(self):
+        """main.py 每个 epoch 追加一行的 metrics.jsonl 里新出现的完整行"""
+        path = os.path.join(self.result_path, 'metrics.jsonl')
+        # --overwrite 时 main.py 启动后才删掉旧目录，在那之前旧的 metrics.jsonl 不能算这次的结果
+        if not os.path.exists(path) or os.path.getmtime(path) < self.started:
+            return []
+        with open(path, 'r') as f:
+            lines = [line for line in f.readlines() if line.endswith('\n')]
+        new = [json.loads(line) for line in lines[len(self.history):]]
+        self.history += new
+        return new
+
+    def best_pcc(self):
+        return max(record['val_pcc'] for record in self.history) if len(self.history) > 0 else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--space', required=True, type=str, help='JSON search space, see core/sweep.load_search_space')
+    parser.add_argument('--sweep_name', default='sweep', type=str,
+                        help='Trials go to <root_path>/<result_path>/<sweep_name>/c<config>_f<fold>')
+    parser.add_argument('--folds', default=0, type=int, help='k-fold cross-validation of zju_va (0: the fixed split)')
+    parser.add_argument('--workers', default=1, type=int, help='Trials running at the same time')
+    parser.add_argument('--devices', nargs='+', default=['cuda:0'], type=str,
+                        help='Devices given to the workers in turn, e.g. cuda:0 cuda:1 or cpu')
+    parser.add_argument('--threads_per_trial', default=0, type=int,
+                        help='CPU trials: --intra_op_threads of each trial (0: torch default)')
+    parser.add_argument('--min_epochs', default=2, type=int, help='First successive halving rung')
+    parser.add_argument('--eta', default=3, type=int,
+                        help='Rungs at min_epochs * eta^k; only the top 1/eta of a rung continue (1: no early stopping)')
+    parser.add_argument('--poll', default=10.0, type=float, help='Seconds between checks of the running trials')
+    args, argv = parser.parse_known_args()
+    # 其余参数原样传给每个 trial 的 main.py
+    opt = parse_opts(argv)
+    if args.folds > 1 and opt.dataset != 'zju_va':
+        raise Exception('k-fold splits are only implemented for zju_va')
+
+    sweep_path = os.path.join(opt.root_path, opt.result_path, args.sweep_name)
+    # 和 local2global_path 一样，只有 --overwrite 时才覆盖已有的结果 (--overwrite 原样传给每个 trial)
+    if os.path.isdir(sweep_path) and not opt.overwrite:
+        existing = [name for name in os.listdir(sweep_path) if re.match(r'c\d{3}(_f\d+)?$', name)]
+        if len(existing) > 0:
+            raise Exception('{} already contains {} trials; pass --overwrite to replace them or choose another '
+                            '--sweep_name'.format(sweep_path, len(existing)))
+    os.makedirs(os.path.join(sweep_path, 'logs'), exist_ok=True)
+    configs = load_search_space(args.space)
+    folds = list(range(args.folds)) if args.folds > 1 else [None]
+    trials = []
+    for config_id, config in enumerate(configs):
+        config_argv = config_args(config, opt)
+        for fold in folds:
+            name = 'c{:03d}'.format(config_id) + ('_f{}'.format(fold) if fold is not None else '')
+            expr_name = os.path.join(args.sweep_name, name)
+            trial_argv = argv + config_argv + ['--expr_name', expr_name]
+            if fold is not None:
+                trial_argv += ['--n_folds', str(args.folds), '--fold', str(fold)]
+            trials.append(Trial(config_id, config, fold, expr_name,
+                                os.path.join(opt.root_path, opt.result_path, expr_name), trial_argv))
+    rungs = rung_epochs(args.min_epochs, args.eta, opt.n_epochs) if args.eta > 1 else []
+    halving = SuccessiveHalving(rungs, args.eta)
+    print('{} configurations x {} folds = {} trials, {} at a time, rungs at epochs {}'.format(
+        len(configs), len(folds), len(trials), args.workers, rungs))
+
+    pending = list(trials)
+    free_slots = list(range(args.workers))
+    stopped_configs = set()
+
+    def launch(trial):
+        trial.slot = free_slots.pop(0)
+        device = args.devices[trial.slot % len(args.devices)]
+        env = dict(os.environ)
+        trial_argv = list(trial.argv)
+        if device.startswith('cuda'):
+            env['CUDA_VISIBLE_DEVICES'] = device.split(':')[1] if ':' in device else '0'
+            trial_argv += ['--device', 'cuda']
+        else:
+            trial_argv += ['--device', 'cpu']
+            if args.threads_per_trial > 0:
+                trial_argv += ['--intra_op_threads', str(args.threads_per_trial)]
+        trial.started = time.time()
+        log = open(os.path.join(sweep_path, 'logs', os.path.basename(trial.expr_name) + '.log'), 'w')
+        trial.process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py')] + trial_argv, cwd=ROOT,
+                                         env=env, stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+        trial.status = 'running'
+        print('start {} on {}: {}'.format(trial.expr_name, device, trial.config))
+
+    def finish(trial, status):
+        if trial.process.poll() is None:
+            trial.process.terminate()
+            trial.process.wait()
+        trial.status = status
+        free_slots.append(trial.slot)
+        print('{} {} after {} epochs, best val PCC {:.4f}'.format(
+            trial.expr_name, status, len(trial.history), trial.best_pcc()))
+
+    while len(pending) > 0 or any(trial.status == 'running' for trial in trials):
+        # 一个配置在任一折上被淘汰后，它剩下的折也不再运行
+        pending = [trial for trial in pending if trial.config_id not in stopped_configs]
+        while len(pending) > 0 and len(free_slots) > 0:
+            launch(pending.pop(0))
+        time.sleep(args.poll)
+
+        for trial in trials:
+            if trial.status != 'running':
+                continue
+            for record in trial.read_metrics():
+                if trial.config_id in stopped_configs:
+                    break
+                if not halving.keep(trial.fold, record['epoch'], record['val_pcc']):
+                    print('{} stopped at rung epoch {} (val PCC {:.4f})'.format(
+                        trial.expr_name, record['epoch'], record['val_pcc']))
+                    stopped_configs.add(trial.config_id)
+            if trial.config_id in stopped_configs:
+                finish(trial, 'stopped')
+            elif trial.process.poll() is not None:
+                trial.read_metrics()
+                finish(trial, 'done' if trial.process.returncode == 0 else 'failed')
+
+    # 每个配置：各折最好的 val PCC 的平均；提前停止的配置排在跑满的之后
+    summary = []
+    for config_id, config in enumerate(configs):
+        config_trials = [trial for trial in trials if trial.config_id == config_id]
+        finished = [trial for trial in config_trials if len(trial.history) > 0]
+        pccs = [trial.best_pcc() for trial in finished]
+        summary.append({
+            'config': config_id,
+            'options': config,
+            'status': 'stopped' if config_id in stopped_configs else
+                      'done' if all(trial.status == 'done' for trial in config_trials) else 'failed',
+            'epochs': [len(trial.history) for trial in config_trials],
+            'mean_best_pcc': sum(pccs) / len(pccs) if len(pccs) > 0 else float('nan'),
+        })
+    summary.sort(key=lambda row: (row['status'] != 'done',
+                                  float('inf') if math.isnan(row['mean_best_pcc']) else -row['mean_best_pcc']))
+    with open(os.path.join(sweep_path, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print('{:<8}{:<10}{:>10}  {}'.format('config', 'status', 'PCC', 'options'))
+    for row in summary:
+        print('c{:03d}    {:<10}{:>10.4f}  {}'.format(row['config'], row['status'], row['mean_best_pcc'],
+                                                    json.dumps(row['options'])))
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python sweep.py --space space.json --folds 5 --workers 4 --devices cuda:0 cuda:1 --min_epochs 2 --eta 3 --n_epochs 18
+"""
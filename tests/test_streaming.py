@@ -0,0 +1,31 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+
+from opts import parse_opts
+from core.model import generate_model
+from core.utils import setup_device, AMP_DTYPES
+from models.streaming import StreamingVAANet
+
+# 随机初始化的小 backbone，只检查 dtype 和形状
+SMALL_MODEL = ['--device', 'cpu', '--resnet101_pretrained', '', '--resnet_depth', '18',
+               '--sample_size', '64', '--snippet_duration', '8', '--seq_len', '4']
+
+
+@pytest.mark.skipif(not hasattr(torch, 'autocast'), reason='--amp needs torch>=1.10')
+def test_push_snippet_with_low_precision_backbone():
+    opt = parse_opts(SMALL_MODEL + ['--amp', 'bf16'])
+    setup_device(opt)
+    model, _ = generate_model(opt)
+    assert next(model.resnet.parameters()).dtype == torch.bfloat16
+
+    stream = StreamingVAANet(model, opt.device, AMP_DTYPES[opt.amp])
+    stream.push_audio_segment(torch.randn(4096 // opt.audio_n_segments, 32))
+    for _ in range(opt.seq_len + 1):
+        output, gamma = stream.push_snippet(torch.randint(0, 256, (3, 8, 64, 64)).float())
+    assert output.shape == (2,)
+    assert gamma.shape == (opt.seq_len,)
+    # 与 infer() 一样输出 fp32
+    assert output.dtype == torch.float32
+    assert torch.isfinite(output).all()
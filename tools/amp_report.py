@@ -0,0 +1,47 @@
+"""
+Compares fp32 with the --amp modes on the validation split of a trained checkpoint.
+
+python -m tools.amp_report --checkpoint /data/jjr/results/demo/checkpoints/save_25.pth --device cpu
+"""
+import time
+
+from opts import parse_opts
+from core.model import generate_model, load_checkpoint
+from core.utils import local2global_data_path, setup_device, predict, calculate_accuracy
+from core.dataset import get_evaluation_loader
+
+AMP_MODES = ['none', 'bf16', 'fp16']
+
+
+def main():
+    opt = parse_opts()
+    setup_device(opt)
+    local2global_data_path(opt)
+    assert opt.checkpoint != '', '--checkpoint is required'
+
+    # 用确定性的预处理，保证每种精度看到完全相同的输入
+    val_loader = get_evaluation_loader(opt)
+
+    results = {}
+    for mode in AMP_MODES:
+        opt.amp = mode
+        model, _ = generate_model(opt)
+        load_checkpoint(model, opt.checkpoint)
+        begin = time.time()
+        try:
+            preds, targets, _ = predict(opt, model, val_loader)
+        except RuntimeError as e:
+            print('Skip {}: {}'.format(mode, e))
+            continue
+        elapsed = time.time() - begin
+        results[mode] = (preds, calculate_accuracy(preds, targets, 'pcc'), elapsed)
+
+    fp32_preds, fp32_pcc, fp32_time = results['none']
+    print('{:<6}{:>10}{:>12}{:>14}{:>10}'.format('amp', 'PCC', 'dPCC', 'max|dpred|', 'speedup'))
+    for mode, (preds, pcc, elapsed) in results.items():
+        print('{:<6}{:>10.4f}{:>12.4f}{:>14.4f}{:>10.2f}'.format(
+            mode, pcc, pcc - fp32_pcc, (preds - fp32_preds).abs().max().item(), fp32_time / elapsed))
+
+
+if __name__ == "__main__":
+    main()
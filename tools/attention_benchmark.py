@@ -0,0 +1,107 @@
+"""
+Fused attention heads (models/attention.py) vs the original repeat()-based heads:
+checks that alpha/beta/gamma and fSCT match, then reports forward / forward+backward latency and
+the bytes of activations saved for backward.
+
+python -m tools.attention_benchmark --device cpu --resnet101_pretrained '' --batch_size 8
+"""
+import time
+
+import torch
+
+from opts import parse_opts
+from core.model import generate_model
+from core.utils import setup_device
+
+
+def reference_visual_heads(model, F):
+    """原来 VisualStream.forward 里基于 repeat 的实现，只用来对照"""
+    seq_len, k, m = model.seq_len, model.hp['k'], model.hp['m']
+    F = model.conv0(F)
+
+    Hs = model.sa_net['conv'](F)
+    Hs = torch.squeeze(Hs, dim=1)
+    Hs = model.sa_net['fc'](Hs)
+    As = model.sa_net['softmax'](Hs.float())
+    As = torch.mul(As, m)
+    alpha = As.view(seq_len, -1, m)
+
+    fS = torch.mul(F, torch.unsqueeze(As, dim=1).repeat(1, k, 1))
+
+    G = fS.transpose(1, 2).contiguous()
+    Hc = model.cwa_net['conv'](G)
+    Hc = torch.squeeze(Hc, dim=1)
+    Hc = model.cwa_net['fc'](Hc)
+    Ac = model.cwa_net['softmax'](Hc.float())
+    Ac = torch.mul(Ac, k)
+    beta = Ac.view(seq_len, -1, k)
+
+    fSC = torch.mul(fS, torch.unsqueeze(Ac, dim=2).repeat(1, 1, m))
+    fSC = torch.mean(fSC, dim=2)
+    fSC = fSC.view(seq_len, -1, k)
+    fSC = fSC.permute(1, 2, 0).contiguous()
+
+    Ht = model.ta_net['conv'](fSC)
+    Ht = torch.squeeze(Ht, dim=1)
+    Ht = model.ta_net['fc'](Ht)
+    At = model.ta_net['relu'](Ht)
+
+    fSCT = torch.mul(fSC, torch.unsqueeze(At, dim=1).repeat(1, k, 1))
+    fSCT = torch.mean(fSCT, dim=2)
+    return fSCT, alpha, beta, At
+
+
+def saved_tensor_bytes(fn, F):
+    """前向时为 backward 保存的激活总字节数"""
+    total = [0]
+
+    def pack(tensor):
+        total[0] += tensor.numel() * tensor.element_size()
+        return tensor
+
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        fn(F)
+    return total[0]
+
+
+def time_step(fn, F, backward, n_warmup=3, n_iters=20):
+    for i in range(n_warmup + n_iters):
+        if i == n_warmup:
+            begin = time.time()
+        outputs = fn(F)
+        if backward:
+            outputs[0].sum().backward()
+    return (time.time() - begin) / n_iters
+
+
+def main():
+    opt = parse_opts()
+    setup_device(opt)
+    opt.compile = False
+    model, _ = generate_model(opt)
+    model.train()
+
+    n_clips = opt.batch_size * opt.seq_len
+    F = torch.randn(n_clips, model.hp['nc'], model.hp['m'], device=opt.device)
+    variants = {
+        'repeat': lambda x: reference_visual_heads(model, x),
+        'fused': model._visual_heads,
+    }
+
+    # train 模式下 BN 用 batch 统计量，两种实现的输入相同所以输出应一致
+    with torch.no_grad():
+        reference, fused = variants['repeat'](F), variants['fused'](F)
+    for name, a, b in zip(['fSCT', 'alpha', 'beta', 'gamma'], reference, fused):
+        print('{:<6} max |diff| = {:.2e}'.format(name, (a - b).abs().max().item()))
+
+    print('{:<8}{:>14}{:>18}{:>18}'.format('', 'forward ms', 'fwd+bwd ms', 'saved act (MB)'))
+    for name, fn in variants.items():
+        with torch.no_grad():
+            forward_time = time_step(fn, F, backward=False)
+        step_time = time_step(fn, F, backward=True)
+        print('{:<8}{:>14.2f}{:>18.2f}{:>18.2f}'.format(name, forward_time * 1000, step_time * 1000,
+                                                         saved_tensor_bytes(fn, F) / 2 ** 20))
+
+
+if __name__ == "__main__":
+    main()
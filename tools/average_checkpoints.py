@@ -0,0 +1,106 @@
+"""
+SWA-style weight averaging of checkpoints saved by val_epoch. The trainable parameters (everything except the
+frozen resnet.*) of the given checkpoints, or of the last --last_n save_*.pth in --ckpt_dir, are averaged into a
+new checkpoint that loads like any other. BatchNorm running statistics are averaged too; with --update_bn they
+are recomputed instead with one pass over the training split, as SWA prescribes.
+
+python -m tools.average_checkpoints --ckpt_dir /data/jjr/results/demo/checkpoints --last_n 5 \
+    --output /data/jjr/results/demo/checkpoints/swa_last5.pth --update_bn
+"""
+import argparse
+import glob
+import os
+import re
+
+import torch
+import torch.nn as nn
+
+from opts import parse_opts
+from core.model import generate_model, load_checkpoint
+from core.utils import local2global_data_path, setup_device, process_data_item, get_spatial_transform, amp_autocast
+from core.dataset import get_training_set, get_data_loader
+from transforms.temporal import TSN
+from transforms.target import ClassLabel
+
+
+def last_checkpoints(ckpt_dir, n):
+    paths = glob.glob(os.path.join(ckpt_dir, 'save_*.pth'))
+    paths.sort(key=lambda path: int(re.search(r'save_(\d+)\.pth$', path).group(1)))
+    return paths[-n:]
+
+
+def average_state_dicts(paths):
+    """浮点张量取平均；整数张量 (num_batches_tracked) 用最后一个 checkpoint 的"""
+    average = None
+    for path in paths:
+        state_dict = torch.load(path, map_location='cpu')['state_dict']
+        state_dict = {k: v for k, v in state_dict.items() if not k.startswith('resnet.')}
+        if average is None:
+            average = {k: v.clone().double() if v.is_floating_point() else v.clone() for k, v in state_dict.items()}
+            continue
+        for k, v in state_dict.items():
+            if v.is_floating_point():
+                average[k] += v.double()
+            else:
+                average[k] = v.clone()
+    # state_dict 是最后一个 checkpoint 的，用它的 dtype，不再从磁盘读一次
+    return {k: (v / len(paths)).to(state_dict[k].dtype) if v.is_floating_point() else v for k, v in average.items()}
+
+
+def update_bn(opt, model):
+    """SWA 的 BN 重估：清空可训练 BN 层的 running stats，用训练集按累计平均 (momentum=None) 重新统计"""
+    bn_layers = [m for m in model.modules() if isinstance(m, nn.modules.batchnorm._BatchNorm)]
+    momenta = {}
+    for m in bn_layers:
+        m.reset_running_stats()
+        momenta[m] = m.momentum
+        m.momentum = None
+    spatial_transform = get_spatial_transform(opt, 'train')
+    temporal_transform = TSN(seq_len=opt.seq_len, snippet_duration=opt.snippet_duration, center=False)
+    loader = get_data_loader(opt, get_training_set(opt, spatial_transform, temporal_transform, ClassLabel()),
+                             shuffle=True)
+    model.train()
+    modality_dropout, model.modality_dropout = model.modality_dropout, 0.0
+    with torch.no_grad():
+        for data_item in loader:
+            visual, _, audio, _, _ = process_data_item(opt, data_item)
+            with amp_autocast(opt):
+                model(visual, audio)
+    model.modality_dropout = modality_dropout
+    for m in bn_layers:
+        m.momentum = momenta[m]
+    model.eval()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checkpoints', nargs='*', default=[], type=str)
+    parser.add_argument('--ckpt_dir', default='', type=str, help='Directory of save_*.pth, used with --last_n')
+    parser.add_argument('--last_n', default=5, type=int)
+    parser.add_argument('--output', required=True, type=str)
+    parser.add_argument('--update_bn', action='store_true', help='Recompute BN statistics on the training split')
+    args, argv = parser.parse_known_args()
+    paths = args.checkpoints if len(args.checkpoints) > 0 else last_checkpoints(args.ckpt_dir, args.last_n)
+    if len(paths) == 0:
+        raise Exception('No checkpoints to average: give --checkpoints or --ckpt_dir')
+    print('Averaging {}'.format(', '.join(paths)))
+    state_dict = average_state_dicts(paths)
+    last = torch.load(paths[-1], map_location='cpu')
+
+    if args.update_bn:
+        opt = parse_opts(argv)
+        setup_device(opt)
+        local2global_data_path(opt)
+        model, _ = generate_model(opt)
+        torch.save({'state_dict': state_dict}, args.output)
+        load_checkpoint(model, args.output)
+        update_bn(opt, model)
+        state_dict = {k: v.cpu() for k, v in model.state_dict().items() if not k.startswith('resnet.')}
+
+    # 和 val_epoch 保存的格式一致；optimizer 状态对平均后的权重没有意义，不保存
+    torch.save({'epoch': last['epoch'], 'state_dict': state_dict, 'averaged_from': paths}, args.output)
+    print('Saved {}'.format(args.output))
+
+
+if __name__ == "__main__":
+    main()
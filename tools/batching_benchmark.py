@@ -0,0 +1,72 @@
+"""
+Throughput and latency of DynamicBatcher (used by serve.py) under concurrent requests, on synthetic
+decoded samples so that only queueing and the model are measured: one model call per request
+(max_batch_size 1) vs dynamic batches.
+
+python -m tools.batching_benchmark --device cpu --resnet101_pretrained '' --clients 16 --max_batch_size 8
+"""
+import argparse
+import threading
+import time
+
+import torch
+
+from opts import parse_opts
+from core.model import generate_model
+from core.utils import setup_device, infer
+from core.serving import DynamicBatcher
+from tools.benchmark_utils import synthetic_batch
+
+
+def run(opt, model, sample, max_batch_size, max_delay, n_clients, n_requests):
+    def score(items):
+        visual = torch.stack([item[0] for item in items])
+        audio = torch.stack([item[1] for item in items])
+        with torch.no_grad():
+            output, _ = infer(opt, model, visual, audio)
+        return list(output.cpu())
+
+    batcher = DynamicBatcher(score, max_batch_size, max_delay)
+
+    def client():
+        for _ in range(n_requests):
+            batcher.submit(sample).result()
+
+    threads = [threading.Thread(target=client) for _ in range(n_clients)]
+    begin = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - begin
+    summary = batcher.summary()
+    return (n_clients * n_requests / elapsed, summary['queue_and_model_p50_ms'], summary['queue_and_model_p99_ms'],
+            summary['mean_batch_size'])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', default=16, type=int, help='Concurrent clients')
+    parser.add_argument('--requests', default=8, type=int, help='Requests per client')
+    parser.add_argument('--max_batch_size', default=8, type=int)
+    parser.add_argument('--max_batch_delay_ms', default=20.0, type=float)
+    args, argv = parser.parse_known_args()
+    opt = parse_opts(argv)
+    setup_device(opt)
+
+    model, _ = generate_model(opt)
+    model.eval()
+    visual, audio = synthetic_batch(opt, batch_size=1)
+    sample = (visual[0], audio[0])
+    # 预热
+    run(opt, model, sample, args.max_batch_size, args.max_batch_delay_ms / 1000, 2, 1)
+
+    print('{:<22}{:>10}{:>10}{:>10}{:>12}'.format('', 'req/s', 'p50 ms', 'p99 ms', 'mean batch'))
+    for name, max_batch_size in [('one call per request', 1), ('dynamic batching', args.max_batch_size)]:
+        throughput, p50, p99, mean_batch = run(opt, model, sample, max_batch_size, args.max_batch_delay_ms / 1000,
+                                               args.clients, args.requests)
+        print('{:<22}{:>10.2f}{:>10.1f}{:>10.1f}{:>12.2f}'.format(name, throughput, p50, p99, mean_batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import time
+
+import torch
+
+
+def time_fn(fn, args, n_warmup=3, n_iters=20):
+    """平均每次调用的秒数"""
+    with torch.no_grad():
+        for _ in range(n_warmup):
+            fn(*args)
+        begin = time.time()
+        for _ in range(n_iters):
+            fn(*args)
+    return (time.time() - begin) / n_iters
+
+
+def synthetic_batch(opt, batch_size=None):
+    """和 DataLoader 输出同形状的随机 visual [bs, seq_len, 3, duration, H, W] 和 MFCC [bs, 4096, 32]"""
+    batch_size = opt.batch_size if batch_size is None else batch_size
+    visual = torch.randint(0, 256, (batch_size, opt.seq_len, 3, opt.snippet_duration, opt.sample_size, opt.sample_size),
+                           device=opt.device).float()
+    audio = torch.randn(batch_size, 4096, 32, device=opt.device)
+    return visual, audio
+
+
+def peak_memory_mb(device):
+    """CUDA 用 max_memory_allocated；CPU 用进程的 max RSS (只增不减，所以每个配置要在单独的进程里测)"""
+    if device.type == 'cuda':
+        return torch.cuda.max_memory_allocated(device) / 2 ** 20
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
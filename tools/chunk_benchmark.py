@@ -0,0 +1,62 @@
+"""
+Peak memory and throughput of one training step for several --backbone_chunk_size values.
+Each chunk size runs in its own process so that the CPU max RSS is not shared between them.
+
+python -m tools.chunk_benchmark --device cpu --resnet101_pretrained '' --batch_size 8 --chunk_sizes 0,48,24,12
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+
+from opts import parse_opts
+from core.model import generate_model
+from core.loss import get_loss
+from core.optimizer import get_optim
+from core.utils import setup_device, run_model
+from tools.benchmark_utils import synthetic_batch, peak_memory_mb
+
+
+def run_chunk_size(argv, chunk_size, n_iters, queue):
+    opt = parse_opts(argv)
+    setup_device(opt)
+    opt.backbone_chunk_size = chunk_size
+    model, parameters = generate_model(opt)
+    criterion = get_loss(opt)
+    optimizer = get_optim(opt, parameters)
+    model.train()
+
+    visual, audio = synthetic_batch(opt)
+    target = visual.new_zeros(opt.batch_size, 2).uniform_(-1, 1)
+    begin = time.time()
+    for i in range(n_iters):
+        _, loss = run_model(opt, [visual, target, audio], model, criterion, print_attention=False)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+    elapsed = (time.time() - begin) / n_iters
+    queue.put((chunk_size, peak_memory_mb(opt.device), opt.batch_size / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunk_sizes', default='0,48,24,12', type=str)
+    parser.add_argument('--n_iters', default=3, type=int)
+    args, argv = parser.parse_known_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    results = []
+    for chunk_size in [int(c) for c in args.chunk_sizes.split(',')]:
+        p = ctx.Process(target=run_chunk_size, args=(argv, chunk_size, args.n_iters, queue))
+        p.start()
+        results.append(queue.get())
+        p.join()
+
+    print('{:<12}{:>16}{:>14}'.format('chunk_size', 'peak mem (MB)', 'videos/s'))
+    for chunk_size, memory, throughput in results:
+        print('{:<12}{:>16.0f}{:>14.2f}'.format(chunk_size, memory, throughput))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Eager vs torch.compile step time of the attention heads and the audio branch on synthetic inputs,
+plus a graph-break audit of both compiled functions.
+
+python -m tools.compile_benchmark --device cpu --resnet101_pretrained '' --batch_size 8
+"""
+import torch
+
+from opts import parse_opts
+from core.model import generate_model
+from core.utils import setup_device
+from tools.benchmark_utils import time_fn
+
+
+def synthetic_inputs(opt, model):
+    """backbone 特征和 MFCC 形状与真实数据一致，数值随机"""
+    n_clips = opt.batch_size * opt.seq_len
+    F = torch.randn(n_clips, model.hp['nc'], model.hp['m'], device=opt.device)
+    audio = torch.randn(opt.batch_size, 4096, 32, device=opt.device)
+    return F, audio
+
+
+def audit_graph_breaks(name, fn, args):
+    try:
+        import torch._dynamo as dynamo
+        explanation = dynamo.explain(fn)(*args)
+    except Exception as e:  # explain 的接口在不同 torch 版本间变化较大
+        print('{}: graph-break audit unavailable ({})'.format(name, e))
+        return
+    print('{}: {} graph(s), {} graph break(s)'.format(name, explanation.graph_count, explanation.graph_break_count))
+    for reason in explanation.break_reasons:
+        print('    {}'.format(reason))
+
+
+def main():
+    opt = parse_opts()
+    setup_device(opt)
+    opt.compile = False
+    model, _ = generate_model(opt)
+    model.eval()
+    F, audio = synthetic_inputs(opt, model)
+
+    eager = {
+        'visual heads': (model._visual_heads, (F,)),
+        'audio branch': (model._audio_branch, (audio,)),
+    }
+    for name, (fn, args) in eager.items():
+        audit_graph_breaks(name, fn, args)
+
+    model.enable_compile()
+    compiled = {
+        'visual heads': (model._visual_heads, (F,)),
+        'audio branch': (model._audio_branch, (audio,)),
+    }
+    print('{:<14}{:>12}{:>14}{:>10}'.format('', 'eager ms', 'compiled ms', 'speedup'))
+    for name in eager:
+        eager_time = time_fn(*eager[name])
+        compiled_time = time_fn(*compiled[name])
+        print('{:<14}{:>12.2f}{:>14.2f}{:>10.2f}'.format(name, eager_time * 1000, compiled_time * 1000,
+                                                         eager_time / compiled_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Inference latency of VAANet with the two branches run one after another vs concurrently
+(--audio_threads), next to the latency of each branch alone.
+
+python -m tools.concurrency_benchmark --device cpu --resnet101_pretrained '' --batch_size 1 \
+    --intra_op_threads 16 --audio_threads 4
+"""
+import torch
+
+from opts import parse_opts
+from core.model import generate_model
+from core.utils import setup_device
+from tools.benchmark_utils import time_fn, synthetic_batch
+
+
+def main():
+    opt = parse_opts()
+    audio_threads = opt.audio_threads
+    setup_device(opt)
+    total_threads = torch.get_num_threads() + audio_threads
+    opt.audio_threads = 0
+    model, _ = generate_model(opt)
+    model.eval()
+    visual, audio = synthetic_batch(opt)
+
+    # 串行时两个分支都用全部线程
+    torch.set_num_threads(total_threads)
+    results = [
+        ('visual only', time_fn(lambda v: model._visual_heads(model._encode(v)), (visual,), n_iters=5)),
+        ('audio only', time_fn(model._audio_branch, (audio,), n_iters=5)),
+        ('sequential', time_fn(model, (visual, audio), n_iters=5)),
+    ]
+    if audio_threads > 0:
+        torch.set_num_threads(max(1, total_threads - audio_threads))
+        model.enable_concurrent_branches(audio_threads)
+        # 确认工作线程的 set_num_threads 没有改掉主线程 (视觉分支) 的线程数
+        print('intra-op threads: visual (main thread) {}, audio worker {}'.format(
+            torch.get_num_threads(), model.audio_runner.worker_threads()))
+        results.append(('concurrent', time_fn(model, (visual, audio), n_iters=5)))
+
+    for name, elapsed in results:
+        print('{:<12}{:>10.1f} ms'.format(name, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    main()
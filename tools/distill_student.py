@@ -0,0 +1,126 @@
+"""
+Distils the 3D ResNet encoder of VAANet into a StudentBackbone (2D ResNet-18 on a few frames per clip).
+The student regresses the teacher's backbone features [nc x m] of every snippet (--distill_target backbone),
+or the output of the teacher's conv0 (--distill_target conv0), on the training split with MSE.
+With --checkpoint, the teacher includes that checkpoint's fine-tuned stages, and the report also gives the
+validation PCC of the checkpoint's heads on top of the teacher and on top of the student.
+
+python -m tools.distill_student --checkpoint /data/jjr/results/demo/checkpoints/save_25.pth \
+    --student_out /data/jjr/results/student-r18.pth --distill_epochs 10 --student_frames 4
+
+Use the student with: python main.py --student_path /data/jjr/results/student-r18.pth ...
+"""
+import argparse
+
+import torch
+import torch.nn as nn
+
+from opts import parse_opts
+from core.model import generate_model, load_checkpoint
+from core.utils import (local2global_data_path, setup_device, process_data_item, amp_autocast, calculate_accuracy,
+                        get_spatial_transform, predict)
+from core.dataset import get_training_set, get_data_loader, get_evaluation_loader
+from models.resnet import resnet_feature_size
+from models.student import StudentBackbone, save_student
+from transforms.temporal import TSN
+from transforms.target import ClassLabel
+from tools.benchmark_utils import time_fn, synthetic_batch
+
+
+def student_features(teacher, student, visual):
+    """与 teacher._encode 同样的输入和输出格式: [batch, seq_len, ...] -> [seq_len * batch, nc, m]"""
+    clips = visual.transpose(0, 1).flatten(0, 1)
+    F = student(teacher._normalize(clips))
+    if teacher.feature_pool is not None:
+        F = teacher.feature_pool(F)
+    return torch.flatten(F, start_dim=2)
+
+
+def distill_loss(teacher, target, F_student, F_teacher):
+    if target == 'conv0':
+        return nn.functional.mse_loss(teacher.conv0(F_student.float()), teacher.conv0(F_teacher.float()))
+    return nn.functional.mse_loss(F_student.float(), F_teacher.float())
+
+
+def run_epoch(opt, args, teacher, student, loader, optimizer=None):
+    training = optimizer is not None
+    student.train(training)
+    total, n = 0.0, 0
+    for data_item in loader:
+        visual, _, _, _, batch = process_data_item(opt, data_item)
+        with torch.no_grad(), amp_autocast(opt):
+            F_teacher = teacher._encode(visual)
+        with torch.set_grad_enabled(training), amp_autocast(opt):
+            loss = distill_loss(teacher, args.distill_target, student_features(teacher, student, visual), F_teacher)
+        if training:
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+        total += loss.item() * batch
+        n += batch
+    return total / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--student_out', required=True, type=str, help='Where to save the distilled student')
+    parser.add_argument('--student_frames', default=4, type=int, help='Frames per snippet seen by the 2D student')
+    parser.add_argument('--distill_target', default='backbone', type=str, choices=['backbone', 'conv0'])
+    parser.add_argument('--distill_epochs', default=10, type=int)
+    parser.add_argument('--distill_lr', default=1e-3, type=float)
+    args, argv = parser.parse_known_args()
+    opt = parse_opts(argv)
+    setup_device(opt)
+    local2global_data_path(opt)
+    opt.student_path = ''
+
+    teacher, _ = generate_model(opt)
+    if opt.checkpoint != '':
+        load_checkpoint(teacher, opt.checkpoint)
+    teacher.eval()
+    for param in teacher.parameters():
+        param.requires_grad = False
+
+    feature_size = resnet_feature_size(opt.snippet_duration, opt.sample_size)
+    student = StudentBackbone(teacher.hp['nc'], feature_size, args.student_frames).to(opt.device)
+    optimizer = torch.optim.Adam(student.parameters(), lr=args.distill_lr)
+
+    spatial_transform = get_spatial_transform(opt, 'train')
+    temporal_transform = TSN(seq_len=opt.seq_len, snippet_duration=opt.snippet_duration, center=False)
+    training_data = get_training_set(opt, spatial_transform, temporal_transform, ClassLabel())
+    train_loader = get_data_loader(opt, training_data, shuffle=True)
+    val_loader = get_evaluation_loader(opt)
+
+    best = float('inf')
+    for epoch in range(1, args.distill_epochs + 1):
+        if hasattr(training_data, 'set_epoch'):
+            training_data.set_epoch(epoch)
+        train_loss = run_epoch(opt, args, teacher, student, train_loader, optimizer)
+        val_loss = run_epoch(opt, args, teacher, student, val_loader)
+        print('Epoch {}: train mse {:.5f}, val mse {:.5f}'.format(epoch, train_loss, val_loss))
+        if val_loss < best:
+            best = val_loss
+            save_student(student, args.student_out)
+
+    # 报告：用保存下来的 student 构建 VAANet，和 teacher 比较视觉编码速度与 PCC
+    opt.student_path = args.student_out
+    student_model, _ = generate_model(opt)
+    student_model.eval()
+    visual, _ = synthetic_batch(opt)
+    teacher_time = time_fn(teacher._encode, (visual,), n_warmup=1, n_iters=5)
+    student_time = time_fn(student_model._encode, (visual,), n_warmup=1, n_iters=5)
+    print('visual encoding: teacher {:.1f} ms, student {:.1f} ms per batch, speedup {:.2f}x'.format(
+        1000 * teacher_time, 1000 * student_time, teacher_time / student_time))
+
+    if opt.checkpoint != '':
+        load_checkpoint(student_model, opt.checkpoint)
+        teacher_preds, targets, _ = predict(opt, teacher, val_loader)
+        student_preds, _, _ = predict(opt, student_model, val_loader)
+        teacher_pcc = calculate_accuracy(teacher_preds, targets, 'pcc')
+        student_pcc = calculate_accuracy(student_preds, targets, 'pcc')
+        print('PCC teacher {:.4f}, student {:.4f}, change {:+.4f}'.format(
+            teacher_pcc, student_pcc, student_pcc - teacher_pcc))
+
+
+if __name__ == "__main__":
+    main()
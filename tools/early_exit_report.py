@@ -0,0 +1,56 @@
+"""
+Full-sequence inference vs attention-driven early exit on the validation split of a trained checkpoint:
+average number of snippets evaluated, PCC change and speedup.
+
+python -m tools.early_exit_report --checkpoint /data/jjr/results/demo/checkpoints/save_25.pth --device cpu \
+    --early_exit_threshold 0.01 --early_exit_max_weight 0.2
+"""
+import time
+
+import torch
+
+from opts import parse_opts
+from core.model import generate_model, load_checkpoint
+from core.utils import local2global_data_path, setup_device, process_data_item, amp_autocast, calculate_accuracy
+from core.dataset import get_evaluation_loader
+
+
+def main():
+    opt = parse_opts()
+    setup_device(opt)
+    local2global_data_path(opt)
+    assert opt.checkpoint != '', '--checkpoint is required'
+    assert opt.early_exit_threshold > 0, '--early_exit_threshold is required'
+    model, _ = generate_model(opt)
+    load_checkpoint(model, opt.checkpoint)
+    model.eval()
+    val_loader = get_evaluation_loader(opt)
+
+    full_preds, exit_preds, targets, n_evaluated = [], [], [], []
+    full_time, exit_time = 0.0, 0.0
+    with torch.no_grad(), amp_autocast(opt):
+        for data_item in val_loader:
+            visual, target, audio, _, _ = process_data_item(opt, data_item)
+            begin = time.time()
+            full_preds.append(model(visual, audio)[0].float().cpu())
+            full_time += time.time() - begin
+
+            begin = time.time()
+            output, _, n = model.forward_early_exit(visual, audio, opt.early_exit_threshold,
+                                                    opt.early_exit_max_weight, opt.early_exit_min_snippets)
+            exit_time += time.time() - begin
+            exit_preds.append(output.float().cpu())
+            n_evaluated.append(n.cpu())
+            targets.append(target.cpu())
+
+    targets = torch.cat(targets)
+    full_pcc = calculate_accuracy(torch.cat(full_preds), targets, 'pcc')
+    exit_pcc = calculate_accuracy(torch.cat(exit_preds), targets, 'pcc')
+    n_evaluated = torch.cat(n_evaluated).float()
+    print('snippets evaluated: {:.2f} / {} on average'.format(n_evaluated.mean().item(), opt.seq_len))
+    print('PCC full {:.4f}, early exit {:.4f}, change {:+.4f}'.format(full_pcc, exit_pcc, exit_pcc - full_pcc))
+    print('speedup {:.2f}x'.format(full_time / exit_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Exports a trained checkpoint as a standalone TorchScript and/or ONNX graph (models/export.ExportableVAANet),
+checks numerical parity of every exported graph against eager VAANet and benchmarks their latency.
+ONNX parity and latency are measured with onnxruntime when it is installed.
+The exported graphs take the uint8 snippets [batch, seq_len, 3, duration, H, W] and MFCC [batch, 4096, 32];
+seq_len / snippet_duration / sample_size are fixed at export time, the batch size is not.
+
+python -m tools.export_model --checkpoint /data/jjr/results/demo/checkpoints/save_25.pth --device cpu \
+    --export_dir /data/jjr/results/demo/export --formats torchscript,onnx
+"""
+import argparse
+import os
+import sys
+
+import torch
+
+from opts import parse_opts
+from core.model import generate_model, load_checkpoint
+from core.utils import setup_device
+from models.export import ExportableVAANet, example_inputs, export_torchscript, export_onnx
+from tools.benchmark_utils import time_fn
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+
+def max_abs_diff(outputs, references):
+    return max((output.float() - reference.float()).abs().max().item()
+               for output, reference in zip(outputs, references))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export_dir', required=True, type=str)
+    parser.add_argument('--formats', default='torchscript,onnx', type=str, help='Comma separated: torchscript, onnx')
+    parser.add_argument('--opset', default=14, type=int, help='ONNX opset version')
+    parser.add_argument('--parity_atol', default=1e-3, type=float, help='Max abs difference allowed vs eager')
+    parser.add_argument('--bench_batch_size', default=1, type=int)
+    args, argv = parser.parse_known_args()
+    opt = parse_opts(argv)
+    if opt.amp != 'none' or opt.compile:
+        raise Exception('Export runs on the fp32 eager model: drop --amp and --compile')
+    setup_device(opt)
+    os.makedirs(args.export_dir, exist_ok=True)
+
+    model, _ = generate_model(opt)
+    if opt.checkpoint != '':
+        load_checkpoint(model, opt.checkpoint)
+    model.eval()
+    wrapper = ExportableVAANet(model)
+    export_inputs = example_inputs(opt)
+    # parity 用和导出时不同的 batch size，顺便检查动态 batch 维
+    visual, audio = example_inputs(opt, batch_size=max(2, args.bench_batch_size))
+
+    with torch.no_grad():
+        reference = model(visual.float(), audio)
+    reference = (reference[0], reference[3])  # va, gamma
+    eager_time = time_fn(model, (visual.float(), audio), n_warmup=1, n_iters=5)
+    results = [('eager', eager_time, 0.0)]
+
+    formats = args.formats.split(',')
+    if 'torchscript' in formats:
+        path = os.path.join(args.export_dir, 'vaanet.ts')
+        export_torchscript(wrapper, export_inputs, path)
+        scripted = torch.jit.load(path, map_location=opt.device)
+        with torch.no_grad():
+            outputs = scripted(visual, audio)
+        results.append(('torchscript', time_fn(scripted, (visual, audio), n_warmup=1, n_iters=5),
+                        max_abs_diff(outputs, reference)))
+        print('Saved {}'.format(path))
+
+    if 'onnx' in formats:
+        path = os.path.join(args.export_dir, 'vaanet.onnx')
+        export_onnx(wrapper, export_inputs, path, args.opset)
+        print('Saved {}'.format(path))
+        if onnxruntime is None:
+            print('onnxruntime is not installed, skipping ONNX parity and latency')
+        else:
+            session = onnxruntime.InferenceSession(path, providers=onnxruntime.get_available_providers())
+            feed = {'visual': visual.cpu().numpy(), 'audio': audio.cpu().numpy()}
+
+            def run_onnx():
+                return session.run(None, feed)
+
+            outputs = [torch.from_numpy(output) for output in run_onnx()]
+            results.append(('onnxruntime', time_fn(run_onnx, (), n_warmup=1, n_iters=5),
+                            max_abs_diff(outputs, [r.cpu() for r in reference])))
+
+    failed = False
+    print('{:<14}{:>14}{:>14}{:>10}'.format('backend', 'latency (ms)', 'max abs diff', 'parity'))
+    for name, elapsed, diff in results:
+        ok = diff <= args.parity_atol
+        failed = failed or not ok
+        print('{:<14}{:>14.1f}{:>14.2e}{:>10}'.format(name, 1000 * elapsed, diff, 'ok' if ok else 'FAIL'))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""
+Inference throughput of VAANet for several input geometries: sample_size x snippet_duration, optionally
+x seq_len (e.g. 112x16x8; default: --seq_len).
+The accuracy cost of a geometry is measured by training/validating with the same
+--sample_size/--snippet_duration (and --feature_grid to keep the heads' shapes fixed).
+seq_len cannot be changed that way: the temporal attention ta_net has a Linear(seq_len, seq_len),
+so a different seq_len always needs a model trained with it.
+
+python -m tools.geometry_benchmark --device cpu --resnet101_pretrained '' --geometries 112x16,96x16,80x16,112x8,112x16x8
+"""
+import argparse
+
+from opts import parse_opts
+from core.model import generate_model
+from core.utils import setup_device
+from tools.benchmark_utils import time_fn, synthetic_batch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--geometries', default='112x16,96x16,80x16,112x8', type=str)
+    args, argv = parser.parse_known_args()
+    opt = parse_opts(argv)
+    setup_device(opt)
+
+    default_seq_len = opt.seq_len
+    results = []
+    for geometry in args.geometries.split(','):
+        values = [int(v) for v in geometry.split('x')]
+        if len(values) not in (2, 3):
+            raise Exception('Geometry {} is not SxD or SxDxL'.format(geometry))
+        opt.sample_size, opt.snippet_duration = values[:2]
+        opt.seq_len = values[2] if len(values) == 3 else default_seq_len
+        model, _ = generate_model(opt)
+        model.eval()
+        visual, audio = synthetic_batch(opt)
+        elapsed = time_fn(model, (visual, audio), n_warmup=1, n_iters=5)
+        results.append((geometry, model.hp['m'], opt.batch_size / elapsed))
+
+    base = results[0][2]
+    print('{:<12}{:>6}{:>12}{:>10}'.format('geometry', 'm', 'videos/s', 'speedup'))
+    for geometry, m, throughput in results:
+        print('{:<12}{:>6}{:>12.2f}{:>10.2f}'.format(geometry, m, throughput, throughput / base))
+
+
+if __name__ == "__main__":
+    main()
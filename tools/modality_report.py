@@ -0,0 +1,50 @@
+"""
+Validation PCC and latency of one trained checkpoint when run audio-visual, visual-only and audio-only.
+The loader decodes both inputs once; the model's modality is switched per pass.
+
+python -m tools.modality_report --checkpoint /data/jjr/results/demo/checkpoints/save_25.pth --device cpu
+"""
+import time
+
+import torch
+
+from opts import parse_opts
+from core.model import generate_model, load_checkpoint
+from core.utils import local2global_data_path, setup_device, process_data_item, amp_autocast, calculate_accuracy
+from core.dataset import get_evaluation_loader
+
+MODALITIES = ['av', 'visual', 'audio']
+
+
+def main():
+    opt = parse_opts()
+    setup_device(opt)
+    local2global_data_path(opt)
+    assert opt.checkpoint != '', '--checkpoint is required'
+    opt.modality = 'av'
+    model, _ = generate_model(opt)
+    load_checkpoint(model, opt.checkpoint)
+    model.eval()
+    val_loader = get_evaluation_loader(opt)
+
+    preds = {modality: [] for modality in MODALITIES}
+    times = {modality: 0.0 for modality in MODALITIES}
+    targets = []
+    with torch.no_grad(), amp_autocast(opt):
+        for data_item in val_loader:
+            visual, target, audio, _, _ = process_data_item(opt, data_item)
+            for modality in MODALITIES:
+                model.modality = modality
+                begin = time.time()
+                preds[modality].append(model(visual, audio)[0].float().cpu())
+                times[modality] += time.time() - begin
+            targets.append(target.cpu())
+
+    targets = torch.cat(targets)
+    for modality in MODALITIES:
+        pcc = calculate_accuracy(torch.cat(preds[modality]), targets, 'pcc')
+        print('{:>6}: PCC {:.4f}, {:.1f} ms / video'.format(modality, pcc, 1000 * times[modality] / len(targets)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+INT8 post-training quantization of a trained checkpoint for CPU inference, with a report of latency,
+model size and validation PCC versus fp32. The two ResNets are calibrated on the first --calib_batches
+batches of the (deterministic) validation split.
+
+python -m tools.quantize_model --checkpoint /data/jjr/results/demo/checkpoints/save_25.pth --device cpu \
+    --quantized_out /data/jjr/results/demo/vaanet-int8.pt --calib_batches 8
+"""
+import argparse
+import io
+import itertools
+import os
+
+import torch
+
+from opts import parse_opts
+from core.model import generate_model, load_checkpoint
+from core.utils import local2global_data_path, setup_device, process_data_item, calculate_accuracy, predict
+from core.dataset import get_evaluation_loader
+from models.quantization import quantize_model, save_quantized_model, load_quantized_model
+from tools.benchmark_utils import time_fn, synthetic_batch
+
+
+def state_dict_size_mb(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quantized_out', required=True, type=str, help='Where to save the quantized model')
+    parser.add_argument('--calib_batches', default=8, type=int, help='Validation batches used for calibration')
+    args, argv = parser.parse_known_args()
+    opt = parse_opts(argv)
+    setup_device(opt)
+    local2global_data_path(opt)
+    if opt.device.type != 'cpu' or opt.amp != 'none':
+        raise Exception('INT8 quantization targets fp32 CPU models: use --device cpu --amp none')
+    if opt.compile:
+        # 编译后的子模块不能被 fx / eager 量化改写
+        raise Exception('--compile cannot be combined with INT8 quantization')
+    assert opt.checkpoint != '', '--checkpoint is required'
+
+    model, _ = generate_model(opt)
+    load_checkpoint(model, opt.checkpoint)
+    model.eval()
+    val_loader = get_evaluation_loader(opt)
+    visual, audio = synthetic_batch(opt)
+
+    fp32_time = time_fn(model, (visual, audio), n_warmup=1, n_iters=5)
+    fp32_size = state_dict_size_mb(model)
+    fp32_preds, targets, _ = predict(opt, model, val_loader)
+
+    calibration = []
+    for data_item in itertools.islice(val_loader, args.calib_batches):
+        visual_batch, _, audio_batch, _, _ = process_data_item(opt, data_item)
+        calibration.append((visual_batch, audio_batch))
+    quantize_model(model, calibration)
+    save_quantized_model(model, args.quantized_out)
+
+    # 从文件重新加载，确认保存的模型可以直接使用
+    model = load_quantized_model(args.quantized_out)
+    int8_time = time_fn(model, (visual, audio), n_warmup=1, n_iters=5)
+    int8_size = state_dict_size_mb(model)
+    int8_preds, _, _ = predict(opt, model, val_loader)
+
+    fp32_pcc = calculate_accuracy(fp32_preds, targets, 'pcc')
+    int8_pcc = calculate_accuracy(int8_preds, targets, 'pcc')
+    print('{:<8}{:>14}{:>12}{:>10}'.format('', 'latency (ms)', 'size (MB)', 'PCC'))
+    print('{:<8}{:>14.1f}{:>12.1f}{:>10.4f}'.format('fp32', 1000 * fp32_time, fp32_size, fp32_pcc))
+    print('{:<8}{:>14.1f}{:>12.1f}{:>10.4f}'.format('int8', 1000 * int8_time, int8_size, int8_pcc))
+    print('speedup {:.2f}x, {:.1f}x smaller, PCC change {:+.4f}; saved to {} ({:.1f} MB)'.format(
+        fp32_time / int8_time, fp32_size / int8_size, int8_pcc - fp32_pcc, args.quantized_out,
+        os.path.getsize(args.quantized_out) / 2 ** 20))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Continuous valence/arousal curve of a long video with StreamingVAANet.
+The video is read as the jpg directory produced by tools/video2jpg.py plus its mp3.
+One snippet is taken every window / seq_len seconds, so the visual branch covers the last --window_seconds.
+Audio segments have the length they have in training, 4096 / audio_n_segments contiguous MFCC rows
+(about 3 s at hop 512 and 44.1 kHz), and the last audio_n_segments of them are kept.
+
+python -m tools.stream_video --checkpoint /path/to/save_25.pth --device cpu \
+    --frames_dir /data/jjr/imgs/xxx --audio_file /data/jjr/mp3/xxx.mp3 --output xxx_va.csv
+"""
+import argparse
+import csv
+import os
+
+import librosa
+import torch
+
+from opts import parse_opts
+from core.model import generate_model, load_checkpoint
+from core.utils import setup_device, get_spatial_transform, AMP_DTYPES
+from datasets.zju_va import get_default_video_loader
+from models.streaming import StreamingVAANet
+
+SAMPLE_RATE = 44100
+N_MFCC = 32
+TIMESERIES_LENGTH = 4096
+HOP_LENGTH = 512  # librosa.feature.mfcc 的默认 hop，与 datasets.zju_va.preprocess_audio 一致
+
+
+def audio_segment(audio_file, begin, duration, rows):
+    """[begin, begin + duration) 秒的 MFCC，按数据集的方式循环补齐/截断到 rows 行"""
+    y, sr = librosa.load(audio_file, sr=SAMPLE_RATE, offset=begin, duration=duration)
+    if len(y) == 0:
+        return None
+    feature = torch.from_numpy(librosa.feature.mfcc(y=y, sr=sr, n_mfcc=N_MFCC).T).float()
+    k = rows // feature.size(0) + 1
+    return feature.repeat(k, 1)[:rows]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames_dir', required=True, type=str)
+    parser.add_argument('--audio_file', required=True, type=str)
+    parser.add_argument('--output', required=True, type=str)
+    parser.add_argument('--window_seconds', default=0.0, type=float,
+                        help='Seconds covered by one window (0: seq_len * snippet_duration / fps)')
+    args, argv = parser.parse_known_args()
+    opt = parse_opts(argv)
+    setup_device(opt)
+    assert opt.checkpoint != '', '--checkpoint is required'
+
+    model, _ = generate_model(opt)
+    load_checkpoint(model, opt.checkpoint)
+    stream = StreamingVAANet(model, opt.device, AMP_DTYPES.get(opt.amp))
+    spatial_transform = get_spatial_transform(opt, 'val')
+    loader = get_default_video_loader()
+
+    n_frames = len([f for f in os.listdir(args.frames_dir) if f.endswith('.jpg')])
+    window = args.window_seconds if args.window_seconds > 0 else opt.seq_len * opt.snippet_duration / opt.fps
+    snippet_period = window / opt.seq_len
+    # 每个音频段与训练时一样是 segment_rows 行连续的 MFCC，而不是把更短的音频循环补齐到 segment_rows 行
+    segment_rows = TIMESERIES_LENGTH // opt.audio_n_segments
+    segment_period = segment_rows * HOP_LENGTH / SAMPLE_RATE
+
+    next_segment = 0.0
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['time', 'valence', 'arousal'])
+        t = 0.0
+        while True:
+            begin_frame = int(round(t * opt.fps)) + 1
+            if begin_frame + opt.snippet_duration - 1 > n_frames:
+                break
+            # 先把截至这个 snippet 结束时的音频段都推进去
+            snippet_end = t + opt.snippet_duration / opt.fps
+            while next_segment + segment_period <= snippet_end:
+                segment = audio_segment(args.audio_file, next_segment, segment_period, segment_rows)
+                if segment is not None:
+                    stream.push_audio_segment(segment)
+                next_segment += segment_period
+
+            frames = loader(args.frames_dir, range(begin_frame, begin_frame + opt.snippet_duration))
+            snippet = torch.stack([spatial_transform(img) for img in frames], 0).permute(1, 0, 2, 3)
+            result = stream.push_snippet(snippet)
+            if result is not None:
+                output, _ = result
+                writer.writerow(['{:.2f}'.format(snippet_end), '{:.4f}'.format(output[0].item()),
+                                 '{:.4f}'.format(output[1].item())])
+            t += snippet_period
+
+
+if __name__ == "__main__":
+    main()
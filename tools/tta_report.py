@@ -0,0 +1,60 @@
+"""
+Validation PCC of a checkpoint with the current random single-view preprocessing (repeated --repeats times
+to show its spread) vs multi-view TTA (--tta_views), with the wall time of each pass including decoding.
+
+python -m tools.tta_report --checkpoint /data/jjr/results/demo/checkpoints/save_25.pth --tta_views 10 --repeats 5
+"""
+import argparse
+import statistics
+import time
+
+from opts import parse_opts
+from core.model import generate_model, load_checkpoint
+from core.utils import local2global_data_path, setup_device, calculate_accuracy, predict, get_spatial_transform
+from core.dataset import get_validation_set, get_data_loader, get_evaluation_loader
+from transforms.temporal import TSN
+from transforms.target import ClassLabel
+
+
+def timed_pcc(opt, model, loader):
+    begin = time.time()
+    preds, targets, _ = predict(opt, model, loader)
+    return calculate_accuracy(preds, targets, 'pcc'), time.time() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', default=5, type=int, help='Passes of the random single-view validation')
+    args, argv = parser.parse_known_args()
+    opt = parse_opts(argv)
+    setup_device(opt)
+    local2global_data_path(opt)
+    assert opt.checkpoint != '', '--checkpoint is required'
+    assert opt.tta_views > 0, '--tta_views is required'
+    n_views = opt.tta_views
+
+    model, _ = generate_model(opt)
+    load_checkpoint(model, opt.checkpoint)
+
+    # 现在的验证方式：随机 TSN crop + 随机 corner crop，单视角
+    opt.tta_views = 0
+    spatial_transform = get_spatial_transform(opt, 'test')
+    temporal_transform = TSN(seq_len=opt.seq_len, snippet_duration=opt.snippet_duration, center=False)
+    random_loader = get_data_loader(opt, get_validation_set(opt, spatial_transform, temporal_transform, ClassLabel()),
+                                    shuffle=False)
+    single = [timed_pcc(opt, model, random_loader) for _ in range(args.repeats)]
+    pccs = [pcc for pcc, _ in single]
+    single_time = statistics.mean(elapsed for _, elapsed in single)
+
+    opt.tta_views = n_views
+    tta_pcc, tta_time = timed_pcc(opt, model, get_evaluation_loader(opt))
+
+    spread = statistics.stdev(pccs) if len(pccs) > 1 else 0.0
+    print('random single view: PCC {:.4f} +- {:.4f} over {} passes, {:.1f}s per pass'.format(
+        statistics.mean(pccs), spread, len(pccs), single_time))
+    print('TTA x{}: PCC {:.4f}, {:.1f}s ({:.2f}x the single-view cost)'.format(
+        n_views, tta_pcc, tta_time, tta_time / single_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,39 @@
-from core.utils import AverageMeter, process_data_item, run_model, calculate_accuracy
+from core.utils import AverageMeter, process_data_item, run_model, calculate_accuracy, get_feature_keys, amp_autocast
 
 import time
+import torch
 
 
-def train_epoch(epoch, data_loader, model, criterion, optimizer, opt, class_names, writer):
+def accumulation_group(i, n_batches, accumulation_steps):
+    """
+    第 i 个 batch 所在的累积组的大小，以及这个 batch 之后是否更新参数
+    最后一组可能不满 accumulation_steps 个 batch，按实际大小平均
+    """
+    group_start = i - i % accumulation_steps
+    group_size = min(accumulation_steps, n_batches - group_start)
+    return group_size, i + 1 == group_start + group_size
+
+
+def backward_step(loss, optimizer, scaler, group_size, update):
+    scaled_loss = loss / group_size
+    if scaler is not None:
+        scaler.scale(scaled_loss).backward()
+    else:
+        scaled_loss.backward()
+    if update:
+        if scaler is not None:
+            scaler.step(optimizer)
+            scaler.update()
+        else:
+            optimizer.step()
+        optimizer.zero_grad()
+
+
+def train_epoch(epoch, data_loader, model, criterion, optimizer, opt, class_names, writer, scaler=None):
     print("# ---------------------------------------------------------------------- #")
     print('Training at epoch {}'.format(epoch))
     model.train()
+    optimizer.zero_grad()
     # print("end of model.train()")
 
     batch_time = AverageMeter()
@@ -22,7 +49,8 @@ def train_epoch(epoch, data_loader, model, criterion, optimizer, opt, class_name
         data_time.update(time.time() - end_time)
         # print("end of process_data_item()")
         
-        output, loss = run_model(opt, [visual, target, audio], model, criterion, i, print_attention=False)
+        output, loss = run_model(opt, [visual, target, audio], model, criterion, i, print_attention=False,
+                                 keys=get_feature_keys(visualization_item))
         # print("end of run_model()")
 
         # 获取这个batch的PCC也就是8个pred和real相关性多少
@@ -32,10 +60,8 @@ def train_epoch(epoch, data_loader, model, criterion, optimizer, opt, class_name
         losses.update(loss.item(), batch_size)
         accuracies.update(acc, batch_size)
 
-        # Backward and optimize
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
+        # Backward and optimize，每 accumulation_steps 个 batch 更新一次
+        backward_step(loss, optimizer, scaler, *accumulation_group(i, len(data_loader), opt.accumulation_steps))
 
         batch_time.update(time.time() - end_time)
         end_time = time.time()
@@ -64,3 +90,65 @@ def train_epoch(epoch, data_loader, model, criterion, optimizer, opt, class_name
     
     writer.add_scalar('train/epoch/loss', losses.avg, epoch)
     writer.add_scalar('train/epoch/acc', accuracies.avg, epoch)
+
+
+def train_epoch_heads(epoch, data_loader, heads, opt):
+    """
+    多 head 训练：每个 batch 只加载一次、冻结的 backbone 只跑一次，其输出交给每个 head
+    (core.multi_head.TrainingHead) 各自 forward / backward / step，loss、PCC 和日志也各自记录
+    """
+    print("# ---------------------------------------------------------------------- #")
+    print('Training {} heads at epoch {}'.format(len(heads), epoch))
+    base = heads[0].model
+    for head in heads:
+        head.model.train()
+        head.optimizer.zero_grad()
+
+    batch_time = AverageMeter()
+    data_time = AverageMeter()
+    losses = [AverageMeter() for _ in heads]
+    accuracies = [AverageMeter() for _ in heads]
+
+    end_time = time.time()
+
+    for i, data_item in enumerate(data_loader):
+        visual, target, audio, visualization_item, batch_size = process_data_item(opt, data_item)
+        data_time.update(time.time() - end_time)
+        keys = get_feature_keys(visualization_item)
+
+        prefix = None
+        if base.modality != 'audio':
+            with torch.no_grad(), amp_autocast(opt):
+                prefix = base.shared_prefix(visual, keys)
+
+        iter = (epoch - 1) * len(data_loader) + (i + 1)
+        for head, head_losses, head_accuracies in zip(heads, losses, accuracies):
+            output, loss = run_model(head.opt, [visual, target, audio], head.model, head.criterion, i,
+                                     print_attention=False, keys=keys, prefix=prefix)
+            head_losses.update(loss.item(), batch_size)
+            head_accuracies.update(calculate_accuracy(output, target, 'pcc'), batch_size)
+
+            backward_step(loss, head.optimizer, head.scaler,
+                          *accumulation_group(i, len(data_loader), head.opt.accumulation_steps))
+
+            head.writer.add_scalar('train/batch/loss', head_losses.val, iter)
+            head.writer.add_scalar('train/batch/acc', head_accuracies.val, iter)
+
+        batch_time.update(time.time() - end_time)
+        end_time = time.time()
+
+        if opt.debug:
+            print('Epoch: [{0}][{1}/{2}]\t'
+                  'Time {batch_time.val:.3f} ({batch_time.avg:.3f})\t'
+                  'Data {data_time.val:.3f} ({data_time.avg:.3f})'.format(
+                epoch, i + 1, len(data_loader), batch_time=batch_time, data_time=data_time))
+            for head, head_losses, head_accuracies in zip(heads, losses, accuracies):
+                print('  {0:<16}Loss {loss.val:.4f} ({loss.avg:.4f})\tPCC {acc.val:.3f} ({acc.avg:.3f})'.format(
+                    head.name, loss=head_losses, acc=head_accuracies))
+
+    # ---------------------------------------------------------------------- #
+    print("Epoch Time: {:.2f}min".format(batch_time.avg * len(data_loader) / 60))
+    for head, head_losses, head_accuracies in zip(heads, losses, accuracies):
+        print("{:<16}Train loss: {:.4f}  Train PCC: {:.4f}".format(head.name, head_losses.avg, head_accuracies.avg))
+        head.writer.add_scalar('train/epoch/loss', head_losses.avg, epoch)
+        head.writer.add_scalar('train/epoch/acc', head_accuracies.avg, epoch)
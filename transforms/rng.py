@@ -0,0 +1,12 @@
+import hashlib
+import random
+
+
+def counter_rng(seed, epoch, key):
+    """
+    Counter-based RNG: the stream depends only on (seed, epoch, key), never on call order or worker,
+    so the same augmented view can be regenerated, precomputed or looked up in a cache.
+    """
+    counter = '{}:{}:{}'.format(seed, epoch, key).encode('utf-8')
+    digest = hashlib.sha256(counter).digest()
+    return random.Random(int.from_bytes(digest[:8], 'little'))
@@ -18,7 +18,7 @@ class SpatialTransform(object):
     def __call__(self, img):
         pass
 
-    def randomize_parameters(self):
+    def randomize_parameters(self, rng=random):
         pass
 
 
@@ -91,8 +91,8 @@ class RandomHorizontalFlip(SpatialTransform):
         else:
             return img
 
-    def randomized_parameters(self):
-        self.p = random.random()
+    def randomized_parameters(self, rng=random):
+        self.p = rng.random()
 
 
 class RandomCenterCornerCrop(SpatialTransform):
@@ -106,8 +106,8 @@ class RandomCenterCornerCrop(SpatialTransform):
         self.interpolation = interpolation
         self.randomize_parameters()
 
-    def randomize_parameters(self):
-        self.crop_position = self.crop_positions[random.randint(0, len(self.crop_positions) - 1)]
+    def randomize_parameters(self, rng=random):
+        self.crop_position = self.crop_positions[rng.randint(0, len(self.crop_positions) - 1)]
 
     def __call__(self, img):
         image_width = img.size[0]
@@ -135,9 +135,9 @@ class Compose(SpatialTransform):
             img = t(img)
         return img
 
-    def randomize_parameters(self):
+    def randomize_parameters(self, rng=random):
         for t in self.transforms:
-            t.randomize_parameters()
+            t.randomize_parameters(rng=rng)
 
 
 class ToTensor(SpatialTransform):
@@ -240,10 +240,10 @@ class RandomApply(SpatialTransform):
         else:
             return img
 
-    def randomize_parameters(self, recursive=True):
-        self.p = random.random()
+    def randomize_parameters(self, recursive=True, rng=random):
+        self.p = rng.random()
         if recursive:
-            self.transform.randomize_parameters()
+            self.transform.randomize_parameters(rng=rng)
 
 
 class RandomChoice(SpatialTransform):
@@ -256,10 +256,10 @@ class RandomChoice(SpatialTransform):
     def __call__(self, img):
         return self.transfrom_to_apply(img)
 
-    def randomize_parameters(self, recursive=True):
-        self.transfrom_to_apply = self.transforms[random.randint(0, len(self.transforms) - 1)]
+    def randomize_parameters(self, recursive=True, rng=random):
+        self.transfrom_to_apply = self.transforms[rng.randint(0, len(self.transforms) - 1)]
         if recursive:
-            self.transfrom_to_apply.randomize_parameters()
+            self.transfrom_to_apply.randomize_parameters(rng=rng)
 
 
 class BrightnessJitter(SpatialTransform):
@@ -272,8 +272,8 @@ class BrightnessJitter(SpatialTransform):
         enhancer = ImageEnhance.Brightness(img)
         return enhancer.enhance(self.factor)
 
-    def randomize_parameters(self):
-        self.factor = random.uniform(self.brightness, 1.0)
+    def randomize_parameters(self, rng=random):
+        self.factor = rng.uniform(self.brightness, 1.0)
 
 
 class RandomRotation(SpatialTransform):
@@ -286,15 +286,18 @@ class RandomRotation(SpatialTransform):
     def __call__(self, img: Image.Image):
         return img.rotate(self.angle, self.interpolation)
 
-    def randomize_parameters(self):
-        self.angle = random.uniform(-self.degrees, self.degrees)
+    def randomize_parameters(self, rng=random):
+        self.angle = rng.uniform(-self.degrees, self.degrees)
 
 
 class Preprocessing(SpatialTransform):
     def __init__(self, size, degrees=20, brightness=0.5, is_aug=True, center=False):
         super(Preprocessing, self).__init__()
+        self.size = size
         self.is_aug = is_aug
         self.center = center
+        # center crop without augmentation always gives the same output, so it can be cached
+        self.deterministic = center and not is_aug
         self.f1_1 = RandomCenterCornerCrop(size)
         self.f1_2 = Compose([Scale(size), CenterCornerCrop(size, 'c')])
         self.f2 = RandomApply(
@@ -317,7 +320,10 @@ class Preprocessing(SpatialTransform):
         img = self.f3(img)
         return img
 
-    def randomize_parameters(self):
-        self.f1_1.randomize_parameters()
+    def randomize_parameters(self, rng=random):
+        self.f1_1.randomize_parameters(rng=rng)
         if self.is_aug:
-            self.f2.randomize_parameters()
+            self.f2.randomize_parameters(rng=rng)
+
+    def cache_config(self):
+        return 'Preprocessing(size={}, is_aug={}, center={})'.format(self.size, self.is_aug, self.center)
@@ -26,9 +26,9 @@ class TemporalRandomCrop(object):
     def __init__(self, size, seed=0):
         self.size = size
 
-    def __call__(self, frame_indices):
+    def __call__(self, frame_indices, rng=random):
         rand_end = max(0, len(frame_indices) - self.size - 1)
-        begin = random.randint(0, rand_end)
+        begin = rng.randint(0, rand_end)
         end = min(begin + self.size, len(frame_indices))
         out = frame_indices[begin:end]
         for index in out:
@@ -48,7 +48,7 @@ class TemporalCenterCrop(object):
     def __init__(self, size):
         self.size = size
 
-    def __call__(self, frame_indices):
+    def __call__(self, frame_indices, rng=None):
         center_index = len(frame_indices) // 2
         begin = max(0, center_index - (self.size // 2))
         end = min(begin + self.size, len(frame_indices))
@@ -65,9 +65,11 @@ class TSN(object):
     def __init__(self, seq_len=12, snippet_duration=16, center=False):
         self.seq_len = seq_len
         self.snippets_duration = snippet_duration
+        self.center = center
+        self.deterministic = center
         self.crop = TemporalRandomCrop(size=self.snippets_duration) if center == False else TemporalCenterCrop(size=self.snippets_duration)
 
-    def __call__(self, frame_indices):
+    def __call__(self, frame_indices, rng=random):
         snippets = []
         pad = LoopPadding(size=self.seq_len * self.snippets_duration)
         frame_indices = pad(frame_indices)
@@ -77,5 +79,8 @@ class TSN(object):
 
         # crop = TemporalRandomCrop(size=self.snippets_duration)
         for i in range(self.seq_len):
-            snippets.append(self.crop(frame_indices[segment_duration * i: segment_duration * (i + 1)]))
+            snippets.append(self.crop(frame_indices[segment_duration * i: segment_duration * (i + 1)], rng))
         return snippets
+
+    def cache_config(self):
+        return 'TSN(seq_len={}, snippet_duration={}, center={})'.format(self.seq_len, self.snippets_duration, self.center)
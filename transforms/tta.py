@@ -0,0 +1,59 @@
+import torch
+
+from transforms.spatial import Compose, RandomCenterCornerCrop, HorizontalFlip, ToTensor
+from transforms.temporal import LoopPadding
+
+CROP_POSITIONS = ('c', 'tl', 'tr', 'bl', 'br')
+
+
+class MultiViewTransform(object):
+    """
+    N deterministic test-time views of a video. In every TSN segment, view i takes the snippet starting at
+    fraction (i + 0.5) / N of the segment's free room, and one of 10 crops (5 positions, then the same 5
+    flipped). With N = 1 this is the center snippet with the center crop.
+    The frames needed by all views are decoded once (see frame_numbers) and every view is built from them.
+    """
+
+    def __init__(self, n_views, size, seq_len, snippet_duration):
+        self.n_views = n_views
+        self.size = size
+        self.seq_len = seq_len
+        self.snippet_duration = snippet_duration
+        self.deterministic = True
+        self.offsets = [(i + 0.5) / n_views for i in range(n_views)]
+        self.spatial_transforms = []
+        for i in range(n_views):
+            transforms = [RandomCenterCornerCrop(size, crop_positions=(CROP_POSITIONS[i % 5],))]
+            if (i // 5) % 2 == 1:
+                transforms.append(HorizontalFlip())
+            transforms.append(ToTensor(norm_value=1))
+            self.spatial_transforms.append(Compose(transforms))
+
+    def temporal_views(self, frame_indices):
+        """每个视角的 snippet 帧号: [n_views][seq_len][snippet_duration]"""
+        frame_indices = LoopPadding(size=self.seq_len * self.snippet_duration)(list(frame_indices))
+        segment_duration = len(frame_indices) // self.seq_len
+        room = segment_duration - self.snippet_duration
+        views = []
+        for offset in self.offsets:
+            begin = int(round(offset * room))
+            views.append([frame_indices[segment_duration * i + begin: segment_duration * i + begin + self.snippet_duration]
+                          for i in range(self.seq_len)])
+        return views
+
+    @staticmethod
+    def frame_numbers(views):
+        """所有视角用到的帧 (去重，排好序)，每帧只解码一次"""
+        return sorted(set(i for view in views for snippet in view for i in snippet))
+
+    def build(self, views, frames):
+        """frames: {帧号: PIL.Image} -> [n_views, seq_len, 3, duration, H, W]"""
+        out = []
+        for transform, view in zip(self.spatial_transforms, views):
+            snippets = [torch.stack([transform(frames[i]) for i in snippet], 0).permute(1, 0, 2, 3) for snippet in view]
+            out.append(torch.stack(snippets, 0))
+        return torch.stack(out, 0)
+
+    def cache_config(self):
+        return 'MultiView(n_views={}, size={}, seq_len={}, snippet_duration={})'.format(
+            self.n_views, self.size, self.seq_len, self.snippet_duration)
@@ -1,4 +1,4 @@
-from core.utils import AverageMeter, process_data_item, run_model, calculate_accuracy
+from core.utils import AverageMeter, process_data_item, run_model, calculate_accuracy, get_feature_keys, amp_autocast
 
 import os
 import time
@@ -25,7 +25,8 @@ def val_epoch(epoch, data_loader, model, criterion, opt, writer, optimizer):
         visual, target, audio, visualization_item, batch_size = process_data_item(opt, data_item)
         data_time.update(time.time() - end_time)
         with torch.no_grad():
-            output, loss = run_model(opt, [visual, target, audio], model, criterion, i)
+            output, loss = run_model(opt, [visual, target, audio], model, criterion, i,
+                                     keys=get_feature_keys(visualization_item))
 
         preds_all.append(output.detach().cpu())
         targets_all.append(target.cpu())
@@ -39,6 +40,12 @@ def val_epoch(epoch, data_loader, model, criterion, opt, writer, optimizer):
 
         print('Validation: [', i, '/', len(data_loader), ']')
 
+    save_validation(epoch, preds_all, targets_all, losses, accuracies, model, opt, writer, optimizer)
+    return accuracies.avg
+
+
+def save_validation(epoch, preds_all, targets_all, losses, accuracies, model, opt, writer, optimizer):
+    """写验证的标量、分布和散点图，并把 checkpoint 存到 opt.ckpt_path"""
     writer.add_scalar('val/loss', losses.avg, epoch)
     writer.add_scalar('val/acc', accuracies.avg, epoch)
     print("Val loss: {:.4f}".format(losses.avg))
@@ -76,3 +83,40 @@ def val_epoch(epoch, data_loader, model, criterion, opt, writer, optimizer):
         'optimizer': optimizer.state_dict(),
     }
     torch.save(states, save_file_path)
+
+
+def val_epoch_heads(epoch, data_loader, heads, opt):
+    """多 head 训练的验证：冻结的 backbone 每个 batch 只跑一次，每个 head 单独记录并保存 checkpoint。返回各 head 的 PCC"""
+    print("# ---------------------------------------------------------------------- #")
+    print('Validation of {} heads at epoch {}'.format(len(heads), epoch))
+    base = heads[0].model
+    for head in heads:
+        head.model.eval()
+    preds_all = [[] for _ in heads]
+    targets_all = []
+    losses = [AverageMeter() for _ in heads]
+    accuracies = [AverageMeter() for _ in heads]
+
+    for i, data_item in enumerate(data_loader):
+        visual, target, audio, visualization_item, batch_size = process_data_item(opt, data_item)
+        keys = get_feature_keys(visualization_item)
+        with torch.no_grad():
+            prefix = None
+            if base.modality != 'audio':
+                with amp_autocast(opt):
+                    prefix = base.shared_prefix(visual, keys)
+            for h, head in enumerate(heads):
+                output, loss = run_model(head.opt, [visual, target, audio], head.model, head.criterion, i,
+                                         print_attention=False, keys=keys, prefix=prefix)
+                preds_all[h].append(output.detach().cpu())
+                losses[h].update(loss.item(), batch_size)
+                accuracies[h].update(calculate_accuracy(output, target, 'pcc'), batch_size)
+        targets_all.append(target.cpu())
+
+        print('Validation: [', i, '/', len(data_loader), ']')
+
+    for h, head in enumerate(heads):
+        print('[{}]'.format(head.name))
+        save_validation(epoch, preds_all[h], targets_all, losses[h], accuracies[h], head.model, head.opt,
+                        head.writer, head.optimizer)
+    return [head_accuracies.avg for head_accuracies in accuracies]